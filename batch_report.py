@@ -0,0 +1,215 @@
+"""
+Close-of-day batch run of the reconciliation report, without Streamlit.
+
+Every Express export in a directory is matched against one stock file and
+written as a customer report, in parallel across cores.
+
+    python batch_report.py EXPORT_DIR --stock STOCK.xlsx --customer GBH --sheet AS
+    python batch_report.py EXPORT_DIR --stock STOCK.xlsx --customer ร้านย่อย --branch 12
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+from zoneinfo import ZoneInfo
+
+from order_check import (
+    STOCK_SHEETS, TEMPLATES, STREAMING_REPORT_MIN_ROWS,
+    ParseReportInputs, GetIndexedStockData,
+    BuildThaiNameReport, StreamThaiNameReport, BuildTemplateReport, LoadTemplate,
+)
+
+EXPRESS_EXTENSIONS = (".xlsx", ".xlsm")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def main(argv=None):
+    args = ParseArguments(argv)
+
+    # "template file/" and .cache/ are resolved from the repository root,
+    # the paths given on the command line from where the CLI was started
+    os.chdir(ROOT)
+
+    express_files = sorted(
+        os.path.join(args.express_dir, name)
+        for name in os.listdir(args.express_dir)
+        if name.lower().endswith(EXPRESS_EXTENSIONS) and not name.startswith("~$")
+    )
+    if not express_files:
+        sys.exit(f"No Express exports found in {args.express_dir}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Index the stock file once up front, the workers then only read it
+    start = time.perf_counter()
+    with open(args.stock, "rb") as stock_file:
+        GetIndexedStockData(stock_file, STOCK_SHEETS[args.customer], args.sheet, [])
+    print(f"Stock index ready in {time.perf_counter() - start:.2f}s")
+
+    jobs = [
+        {
+            "express_path": path,
+            "stock_path": args.stock,
+            "customer": args.customer,
+            "sheet": args.sheet,
+            "streaming": args.streaming,
+            "settings": GetReportSettings(args, path),
+            "output_path": GetOutputPath(args, path),
+        }
+        for path in express_files
+    ]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(RunJob, jobs))
+    wall_time = time.perf_counter() - start
+
+    PrintTimingReport(results, wall_time)
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+def ParseArguments(argv):
+    parser = argparse.ArgumentParser(description="Generate reconciliation reports for a directory of Express exports.")
+    parser.add_argument("express_dir", help="directory holding the Express exports (.xlsx)")
+    parser.add_argument("--stock", required=True, help="stock workbook shared by every export")
+    parser.add_argument("--customer", required=True, choices=list(STOCK_SHEETS))
+    parser.add_argument("--sheet", help="template sheet for GBH/DH/HP, defaults to the first one")
+    parser.add_argument("--output-dir", default="reports", help="where the reports are written (default: reports)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+
+    # GBH/DH/HP header
+    parser.add_argument("--start-date", type=date.fromisoformat, help="YYYY-MM-DD, defaults to today")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="YYYY-MM-DD, defaults to the start date")
+
+    # ร้านย่อย header
+    parser.add_argument("--title", default="", help="report title, defaults to the export file name")
+    parser.add_argument("--branch", default="", help="branch number")
+    parser.add_argument("--version", default="")
+    parser.add_argument("--streaming", action="store_true",
+                        help=f"always stream the ร้านย่อย report (write-only workbook), not only from "
+                             f"{STREAMING_REPORT_MIN_ROWS:,} barcodes on")
+
+    args = parser.parse_args(argv)
+
+    args.express_dir = os.path.abspath(args.express_dir)
+    args.stock = os.path.abspath(args.stock)
+    args.output_dir = os.path.abspath(args.output_dir)
+
+    if args.customer in TEMPLATES:
+        sheets = TEMPLATES[args.customer]["sheets"]
+        args.sheet = args.sheet or sheets[0]
+        if args.sheet not in sheets:
+            parser.error(f"--sheet for {args.customer} must be one of {', '.join(sheets)}")
+    elif args.sheet:
+        parser.error(f"--sheet does not apply to {args.customer}")
+
+    if args.streaming and args.customer in TEMPLATES:
+        parser.error("--streaming only applies to ร้านย่อย")
+
+    return args
+
+def GetReportSettings(args, express_path):
+    """
+    Header values of one report, formatted the way the page formats them.
+    """
+    if args.customer not in TEMPLATES:
+        now = datetime.now(ZoneInfo("Asia/Bangkok"))
+        return {
+            "title": args.title or os.path.splitext(os.path.basename(express_path))[0],
+            "date": now.strftime("%d/%m/") + str(now.year + 543),
+            "time": now.strftime("%H:%M"),
+            "branch_number": args.branch,
+            "version": args.version,
+        }
+
+    start_date = args.start_date or date.today()
+    end_date = args.end_date or start_date
+    return {
+        "start_date": f"{start_date.strftime('%d.%m')}.{start_date.year + 543}",
+        "end_date": f"{end_date.strftime('%d.%m')}.{end_date.year + 543}",
+    }
+
+def GetOutputPath(args, express_path):
+    stem = os.path.splitext(os.path.basename(express_path))[0]
+    suffix = f"{args.customer}_{args.sheet}" if args.sheet else args.customer
+    return os.path.join(args.output_dir, f"{stem}_{suffix}.xlsx")
+
+def RunJob(job):
+    """
+    Parse, summarise, join with stock and write one report (runs in a worker).
+
+    Returns:
+        dict: file names, per stage seconds and the error message, if any.
+    """
+    result = {
+        "express": os.path.basename(job["express_path"]),
+        "output": job["output_path"],
+        "rows": 0,
+        "timings": {},
+        "error": None,
+    }
+    timings = result["timings"]
+    settings = job["settings"]
+
+    try:
+        start = time.perf_counter()
+        with open(job["express_path"], "rb") as express_file, open(job["stock_path"], "rb") as stock_file:
+            express_data, bill_numbers, total, stock_data = ParseReportInputs(
+                express_file, stock_file, job["customer"], job["sheet"]
+            )
+        timings["parse"] = time.perf_counter() - start
+        result["rows"] = len(express_data)
+
+        start = time.perf_counter()
+        streaming = job["customer"] not in TEMPLATES and (
+            job["streaming"] or len(express_data) >= STREAMING_REPORT_MIN_ROWS
+        )
+
+        if streaming:
+            # Rows are serialized as they are written, there is no separate save
+            StreamThaiNameReport(job["output_path"], settings, express_data, bill_numbers, total, stock_data)
+            timings["write"] = time.perf_counter() - start
+        else:
+            if job["customer"] in TEMPLATES:
+                wb = BuildTemplateReport(
+                    LoadTemplate(job["customer"], job["sheet"]), job["customer"],
+                    settings["start_date"], settings["end_date"],
+                    express_data, bill_numbers, total, stock_data,
+                )
+            else:
+                wb = BuildThaiNameReport(settings, express_data, bill_numbers, total, stock_data)
+            timings["write"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            wb.save(job["output_path"])
+            timings["save"] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    return result
+
+def PrintTimingReport(results, wall_time):
+    name_width = max(len("file"), *(len(result["express"]) for result in results))
+
+    print(f"{'file':<{name_width}}  {'rows':>7}  {'parse':>7}  {'write':>7}  {'save':>7}  {'total':>7}")
+    for result in results:
+        timings = result["timings"]
+        cells = [
+            f"{timings[stage]:6.2f}s" if stage in timings else f"{'-':>7}"
+            for stage in ("parse", "write", "save")
+        ]
+        line = f"{result['express']:<{name_width}}  {result['rows']:>7}  {'  '.join(cells)}  {sum(timings.values()):6.2f}s"
+        if result["error"]:
+            line += f"  FAILED {result['error']}"
+        print(line)
+
+    failed = sum(1 for result in results if result["error"])
+    busy = sum(sum(result["timings"].values()) for result in results)
+    print(f"{len(results) - failed}/{len(results)} reports written in {wall_time:.2f}s "
+          f"({busy:.2f}s of work across workers)")
+
+if __name__ == "__main__":
+    main()
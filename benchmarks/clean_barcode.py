@@ -0,0 +1,96 @@
+"""
+Fuzz the price checker's memoized clean_barcode and batch clean_barcodes
+against the original clean_barcode, then time them on a day's worth of
+repeated barcodes.
+
+    python -m benchmarks.clean_barcode [--fuzz 200000] [--sizes 30000 300000]
+"""
+import argparse
+import random
+import re
+import time
+
+import pandas as pd
+
+from benchmarks.suite import LoadPage
+from benchmarks.synthetic import price_report_lines
+
+SPACE_CHARS = r"\u0020\u00A0\u1680\u2000-\u200A\u202F\u205F\u3000"
+
+# Every class of character the three passes treat differently
+FUZZ_PIECES = (
+    "No", "NO", "no", "nO", "N", "o", "NoNo", "885", "0", "12", "A", "x", "(", ")", "[", "-", ".",
+    "/", "+", "\u0e01", "\u0e0a\u0e34\u0e49\u0e19", "\u0e51",
+    " ", "  ", "\u00a0", "\u1680", "\u2000", "\u2005", "\u200a", "\u202f", "\u205f", "\u3000",
+    "\t", "\n", "\r", "\u0085", "\u2028", "\u200b", "\ufeff",
+)
+FUZZ_NON_TEXT = (None, float("nan"), pd.NA, 12, 1.5, 885000000001)
+
+
+def LegacyCleanBarcode(raw: str) -> str:
+    """clean_barcode as it was, three uncompiled regex passes per call."""
+    if pd.isna(raw):
+        return ""
+
+    s = str(raw)
+    s = re.sub(f"[{SPACE_CHARS}]+", " ", s)
+    s = s.strip()
+    s = re.sub(r"^(?:No)+", "", s, flags=re.IGNORECASE).strip()
+    m = re.match(rf"^[^ /\+\u0E00-\u0E7F]+", s)
+    return m.group(0) if m else s
+
+
+def FuzzValues(n_values, seed=0):
+    rnd = random.Random(seed)
+    values = []
+    for _ in range(n_values):
+        if rnd.random() < 0.02:
+            values.append(rnd.choice(FUZZ_NON_TEXT))
+        else:
+            values.append("".join(rnd.choice(FUZZ_PIECES) for _ in range(rnd.randint(0, 8))))
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=200_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30_000, 300_000])
+    args = parser.parse_args()
+
+    page = LoadPage("product_price_checker")
+
+    values = FuzzValues(args.fuzz, seed=args.fuzz)
+    expected = [LegacyCleanBarcode(value) for value in values]
+
+    assert [page.clean_barcode(value) for value in values] == expected, "clean_barcode differs"
+    # Again, now answered from the memo
+    assert [page.clean_barcode(value) for value in values] == expected, "memoized clean_barcode differs"
+    assert page.clean_barcodes(pd.Series(values, dtype=object)).tolist() == expected, "clean_barcodes differs"
+
+    text = [value for value in values if isinstance(value, str)]
+    assert page.clean_barcodes(pd.Series(text, dtype="str")).tolist() == [LegacyCleanBarcode(value) for value in text], \
+        "clean_barcodes differs on a str Series"
+
+    print(f"{args.fuzz:,} fuzzed values: clean_barcode and clean_barcodes match the original")
+
+    for size in args.sizes:
+        # The report's barcodes, five days over: the same items come back every day
+        barcodes = [line.split("  ")[1] for line in price_report_lines(size // 5, seed=size) if line[0].isdigit()] * 5
+        series = pd.Series(barcodes, dtype="str")
+        page.clean_barcode_text.cache_clear()
+
+        timings = {}
+        for name, func in (
+            ("original", lambda: [LegacyCleanBarcode(value) for value in barcodes]),
+            ("memoized", lambda: [page.clean_barcode(value) for value in barcodes]),
+            ("batch", lambda: page.clean_barcodes(series).tolist()),
+        ):
+            start = time.perf_counter()
+            func()
+            timings[name] = time.perf_counter() - start
+
+        print(f"{len(barcodes):>9,} barcodes  " + "  ".join(f"{name} {seconds:7.3f}s" for name, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Check the indexed find_unmatched_and_outdated of the price checker
+against the previous nested scan and time both.
+
+    python -m benchmarks.price_matcher [--sizes 1000 5000 30000]
+
+The report gets a repeated block of lines with other prices, so the
+first-match-wins rule is exercised. The nested scan is O(n x m) and is
+skipped above --max-legacy-rows.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.suite import LoadPage
+from benchmarks.synthetic import price_report_lines, price_update_workbook
+
+
+def LegacyFindUnmatchedAndOutdated(page, left_table, right_df):
+    """find_unmatched_and_outdated as it was, one scan of the report per row."""
+    keep_unmatch_idx = []
+    keep_outdated_idx = []
+
+    for i, row in right_df.iterrows():
+        search = page.clean_barcode(row.iloc[0])
+        found_idx = None
+
+        for j, prod in left_table['Product'].items():
+            if str(search).strip() == str(prod).strip():
+                found_idx = j
+                break
+
+        if found_idx is None:
+            keep_unmatch_idx.append(i)
+        else:
+            left_price_val = page.numeric_value_for_compare(left_table.loc[found_idx, 'Unit Price'])
+            right_price_val = page.numeric_value_for_compare(row.iloc[3]) if len(row) > 3 else float('nan')
+            if round(left_price_val,2) != round(right_price_val,2):
+                keep_outdated_idx.append(i)
+
+    return keep_unmatch_idx, keep_outdated_idx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 5_000, 30_000])
+    parser.add_argument("--max-legacy-rows", type=int, default=5_000)
+    args = parser.parse_args()
+
+    page = LoadPage("product_price_checker")
+
+    for size in args.sizes:
+        lines = price_report_lines(size, seed=size)
+        # The same items again further down with other prices: the first line must win
+        repeated = price_report_lines(size // 10, seed=size + 1)
+        left_table = page.parse_left_report(pd.DataFrame({0: lines + repeated}))
+        right_df = pd.read_excel(price_update_workbook(size, seed=size), header=0, dtype=str, engine="openpyxl")
+
+        start = time.perf_counter()
+        result = page.find_unmatched_and_outdated(left_table, right_df)
+        indexed_time = time.perf_counter() - start
+
+        line = (f"{size:>9,} rows  {len(result[0]):>6,} not found  {len(result[1]):>6,} outdated  "
+                f"indexed {indexed_time:7.3f}s")
+
+        if size <= args.max_legacy_rows:
+            start = time.perf_counter()
+            expected = LegacyFindUnmatchedAndOutdated(page, left_table, right_df)
+            legacy_time = time.perf_counter() - start
+
+            assert result == expected, f"indexed matching differs at {size} rows"
+            line += f"  nested scan {legacy_time:7.3f}s  x{legacy_time / indexed_time:.0f}"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Check the columnar parse_left_report of the price checker against the
+previous iterrows parser and measure its throughput.
+
+    python -m benchmarks.price_report_parser [--sizes 10000 100000 1000000]
+
+Besides the synthetic 42C-R1 report, every size is checked on fuzzed
+lines: Unicode spaces, Thai digits, malformed prices and short lines.
+The iterrows parser is skipped above --max-legacy-rows.
+"""
+import argparse
+import random
+import re
+import time
+
+import pandas as pd
+
+from benchmarks.suite import LoadPage
+from benchmarks.synthetic import price_report_lines
+
+FUZZ_TOKENS = (
+    "12", "\u0e51\u0e52", "0012", "12a", "-1", "", " ", "\u00a0", "No885", "nono885/\u0e01", "(885)", "885+1",
+    "12.50", "1,234.00", ".5", "5.", "1.2.3", "-", "--1", "\u0e23\u0e32\u0e04\u0e32", "\u0e51\u0e52.\u0e55",
+    "1e5", "1_0", "inf",
+)
+FUZZ_SEPARATORS = ("  ", "   ", " ", "\t\t", "\u00a0\u00a0", " \u3000", "\u2003 ", "\n\n")
+
+
+def LegacyParseLeftReport(page, left_df):
+    """parse_left_report as it was, one iterrows step and re.split per line."""
+    left_indices = []
+    left_products = []
+    left_prices = []
+
+    for i, row in left_df.iterrows():
+        row_str = str(row[0])
+        cols = re.split(r'\s{2,}', row_str.strip())
+        if len(cols) < 2:
+            continue
+        if not page.is_integer_token(cols[0]):
+            continue
+
+        left_indices.append(i)
+        cleaned_prod = page.clean_barcode(cols[1])
+        left_products.append(cleaned_prod)
+
+        if len(cols) >= 4 and page.numeric_value_for_compare(cols[3]) == page.numeric_value_for_compare(cols[3]):
+            left_prices.append(cols[3])
+        elif len(cols) >= 5:
+            left_prices.append(cols[4])
+        else:
+            left_prices.append("")
+
+    return pd.DataFrame({
+        "Index": left_indices,
+        "Product": left_products,
+        "Unit Price": left_prices
+    })
+
+
+def FuzzLines(n_lines, seed=0):
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(n_lines):
+        tokens = [rnd.choice(FUZZ_TOKENS) for _ in range(rnd.randint(0, 7))]
+        line = ""
+        for token in tokens:
+            line += token + rnd.choice(FUZZ_SEPARATORS)
+        lines.append(rnd.choice(("", " ", "\u00a0")) + line)
+    return lines + [None]
+
+
+def Check(page, lines, label):
+    left_df = pd.DataFrame({0: pd.Series(lines, dtype="str")})
+    expected = LegacyParseLeftReport(page, left_df)
+    result = page.parse_left_report(left_df)
+
+    assert result.equals(expected) and (result.dtypes == expected.dtypes).all(), f"left_table differs on {label}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-legacy-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    page = LoadPage("product_price_checker")
+
+    for size in args.sizes:
+        fuzz_size = min(size, 20_000)
+        Check(page, FuzzLines(fuzz_size, seed=size), f"{fuzz_size:,} fuzzed lines")
+
+        lines = price_report_lines(size, seed=size)
+        left_df = pd.DataFrame({0: pd.Series(lines, dtype="str")})
+
+        start = time.perf_counter()
+        result = page.parse_left_report(left_df)
+        columnar_time = time.perf_counter() - start
+
+        line = (f"{len(lines):>9,} lines  {len(result):>9,} items  columnar {columnar_time:7.3f}s "
+                f"({len(lines) / columnar_time:>9,.0f} lines/s)")
+
+        if size <= args.max_legacy_rows:
+            start = time.perf_counter()
+            expected = LegacyParseLeftReport(page, left_df)
+            legacy_time = time.perf_counter() - start
+
+            assert result.equals(expected), f"left_table differs at {size} rows"
+            line += f"  iterrows {legacy_time:7.3f}s ({len(lines) / legacy_time:>9,.0f} lines/s)"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Time and peak memory of the ร้านย่อย report written through the regular
+workbook (BuildThaiNameReport + save) and through the write-only engine
+(StreamThaiNameReport). Each run happens in a fresh process so the peak
+resident size belongs to that engine alone.
+
+    python -m benchmarks.streaming_writer [--sizes 10000 100000 500000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+HEADER = {"title": "Benchmark", "date": "17/10/2569", "time": "10:00", "branch_number": "12", "version": "v1"}
+
+
+def Run(engine, size, path, results):
+    from order_check import BuildThaiNameReport, StreamThaiNameReport
+    from benchmarks.synthetic import summary_frame, stock_rows
+
+    summary = summary_frame(size, seed=size)
+    stock = stock_rows(size, seed=size)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if engine == "workbook":
+        wb = BuildThaiNameReport(HEADER, summary, ["IV68000001", "IV68000002"], "1,234.00", stock)
+        built = time.perf_counter()
+        wb.save(path)
+    else:
+        built = start
+        StreamThaiNameReport(path, HEADER, summary, ["IV68000001", "IV68000002"], "1,234.00", stock)
+    end = time.perf_counter()
+
+    results.put({
+        "build": built - start,
+        "save": end - built,
+        "total": end - start,
+        # ru_maxrss is in KiB on Linux
+        "peak_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024,
+        "file_mb": os.path.getsize(path) / 2**20,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for engine in ("workbook", "streaming"):
+                results = context.Queue()
+                process = context.Process(
+                    target=Run, args=(engine, size, os.path.join(directory, f"{engine}.xlsx"), results)
+                )
+                process.start()
+                process.join()
+
+                if process.exitcode != 0:
+                    print(f"{size:>9,} rows  {engine:<9}  failed (exit code {process.exitcode})")
+                    continue
+
+                result = results.get()
+                print(
+                    f"{size:>9,} rows  {engine:<9}  build {result['build']:7.2f}s  save {result['save']:7.2f}s  "
+                    f"total {result['total']:7.2f}s  peak +{result['peak_mb']:7.1f} MB  file {result['file_mb']:.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
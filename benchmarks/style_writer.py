@@ -0,0 +1,156 @@
+"""
+Time the ร้านย่อย writer with the shared style registry against the
+previous per-cell Font() writer, and compare output sizes. Each writer is
+finished by the width and border pass of its own time, so both files hold
+the same formatting.
+
+    python -m benchmarks.style_writer [--sizes 10000 100000]
+"""
+import argparse
+import time
+from io import BytesIO
+
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from order_check import (
+    BORDER, CENTER, ERROR_HIGHLIGHT, SafeInt,
+    GenerateExcel, WriteMainData, AdjustExcelColWidthAndAddBorder,
+)
+from benchmarks.synthetic import summary_items, summary_frame, stock_rows
+
+
+def LegacyWriteMainData(wb, express_data, stock_data):
+    """WriteMainData as it was before the style registry."""
+    ws = wb.active
+
+    stock_lookup = {
+        SafeInt(row[0]): row[1:]
+        for row in stock_data
+        if SafeInt(row[0]) is not None
+    }
+
+    for idx, item in enumerate(express_data, start=1):
+        excel_row = idx + 5
+
+        cell = ws[f"A{excel_row}"]
+        cell.value = idx
+        cell.alignment = CENTER
+        cell.font = Font(size=12)
+
+        ws[f"D{excel_row}"].value = item["sum_qty"]
+        ws[f"D{excel_row}"].alignment = CENTER
+        ws[f"D{excel_row}"].font = Font(size=12)
+
+        if "_" in item["barcode"]:
+            before, _, after = item["barcode"].partition("_")
+            ws[f"B{excel_row}"].value = before
+            ws[f"B{excel_row}"].alignment = CENTER
+            ws[f"B{excel_row}"].font = Font(size=12)
+            ws[f"B{excel_row}"].fill = ERROR_HIGHLIGHT
+
+            ws[f"C{excel_row}"] = after
+            ws[f"C{excel_row}"].alignment = CENTER
+            ws[f"C{excel_row}"].font = Font(size=12)
+            continue
+
+        ws[f"B{excel_row}"].value = item["barcode"]
+        ws[f"B{excel_row}"].alignment = CENTER
+        ws[f"B{excel_row}"].font = Font(size=12)
+
+        barcode = SafeInt(item.get("barcode"))
+        stock_item = stock_lookup.pop(barcode, None)
+
+        if stock_item is not None:
+            ws[f"C{excel_row}"].value = stock_item[0]
+            ws[f"C{excel_row}"].alignment = CENTER
+            ws[f"C{excel_row}"].font = Font(size=12)
+
+            ws[f"E{excel_row}"].value = stock_item[1]
+            ws[f"E{excel_row}"].alignment = CENTER
+            ws[f"E{excel_row}"].font = Font(size=12)
+        else:
+            ws[f"C{excel_row}"].value = (
+                "Cannot find the barcode.\nUpdate the main sheet of the stock file."
+            )
+            ws[f"C{excel_row}"].alignment = CENTER
+            ws[f"C{excel_row}"].font = Font(size=12)
+            ws[f"C{excel_row}"].fill = ERROR_HIGHLIGHT
+
+    return wb
+
+
+def LegacyAdjustExcelColWidthAndAddBorder(wb):
+    """
+    AdjustExcelColWidthAndAddBorder as it was before the writers tracked
+    widths and borders: a full scan that borders and measures every cell
+    from row 5 down.
+    """
+    ws = wb.active
+
+    min_col = 1
+    max_col = ws.max_column
+    min_row = 5
+    max_row = ws.max_row
+
+    for col in range(min_col, max_col + 1):
+        col_letter = get_column_letter(col)
+        max_len = 0
+
+        for row in range(min_row, max_row + 1):
+            value = ws.cell(row=row, column=col).value
+            ws.cell(row=row, column=col).border = BORDER
+            if value is None:
+                continue
+
+            text = str(value).split("\n")[0]
+
+            if len(text) > max_len:
+                max_len = len(text)
+
+        padding = 6 if col != 1 else 3
+        ws.column_dimensions[col_letter].width = min(max_len + padding, 60)
+
+    return wb
+
+
+def Measure(writer, finisher, items, stock):
+    wb = GenerateExcel()
+
+    start = time.perf_counter()
+    writer(wb, items, stock)
+    finisher(wb)
+    write_time = time.perf_counter() - start
+
+    output = BytesIO()
+    start = time.perf_counter()
+    wb.save(output)
+    save_time = time.perf_counter() - start
+
+    return write_time, save_time, len(output.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        # The legacy writer takes the list of dicts, the current one the frame
+        items = summary_items(size, seed=size)
+        frame = summary_frame(size, seed=size)
+        stock = stock_rows(int(size * 0.9), seed=size)
+
+        for name, writer, finisher, data in (
+            ("per-cell Font", LegacyWriteMainData, LegacyAdjustExcelColWidthAndAddBorder, items),
+            ("style registry", WriteMainData, AdjustExcelColWidthAndAddBorder, frame),
+        ):
+            write_time, save_time, file_size = Measure(writer, finisher, data, stock)
+            print(
+                f"{size:>8,} rows  {name:<15} write {write_time:7.3f}s"
+                f"  save {save_time:7.3f}s  {file_size / 1024:9.1f} KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
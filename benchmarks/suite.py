@@ -0,0 +1,257 @@
+"""
+Time every stage of the three tools on synthetic inputs of growing size
+and save the results as JSON, so two versions can be compared.
+
+    python -m benchmarks.suite [--sizes 1000 10000 100000 1000000] [--output FILE]
+
+Stages that load or write a whole openpyxl workbook are skipped above
+--max-workbook-rows (their memory grows with the sheet), and a stage that
+took longer than --budget seconds is not run again at the next size. Both
+show up in the JSON as skipped, with the reason.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+from openpyxl import load_workbook
+from streamlit.logger import set_log_level
+
+import order_check
+from benchmarks import synthetic
+
+# order_check and the pages run outside a Streamlit session, which Streamlit
+# warns about on every cache and widget call
+set_log_level("error")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def LoadPage(name):
+    """Import a Streamlit page as a module, its widgets are inert outside a session."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, "pages", f"{name}.py"))
+    page = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(page)
+    return page
+
+
+class Recorder:
+    """Times stages and applies the workbook size cap and the time budget."""
+
+    def __init__(self, max_workbook_rows, budget):
+        self.max_workbook_rows = max_workbook_rows
+        self.budget = budget
+        self.results = []
+        self.over_budget = set()
+
+    def run(self, tool, stage, rows, func, workbook=False):
+        key = (tool, stage)
+        record = {"tool": tool, "stage": stage, "rows": rows}
+
+        if workbook and rows > self.max_workbook_rows:
+            record["skipped"] = f"above --max-workbook-rows {self.max_workbook_rows}"
+        elif key in self.over_budget:
+            record["skipped"] = f"over the {self.budget}s budget at a smaller size"
+
+        if "skipped" in record:
+            self.results.append(record)
+            print(f"  {tool:<24} {stage:<36} {rows:>9,}  skipped ({record['skipped']})")
+            return None
+
+        start = time.perf_counter()
+        value = func()
+        record["seconds"] = time.perf_counter() - start
+
+        if record["seconds"] > self.budget:
+            self.over_budget.add(key)
+
+        self.results.append(record)
+        print(f"  {tool:<24} {stage:<36} {rows:>9,}  {record['seconds']:9.3f}s")
+        return value
+
+
+def SaveToBytes(wb):
+    output = BytesIO()
+    wb.save(output)
+    return output
+
+
+def BenchOrderCheck(rec, size):
+    tool = "order_check"
+
+    express_file = rec.run(tool, "generate Express export", size,
+                           lambda: synthetic.express_workbook(size, seed=size))
+    rec.run(tool, "GetExpressData", size,
+            lambda: order_check.GetExpressData(express_file))
+
+    rows = synthetic.express_rows(size, seed=size)
+    express_data, bill_numbers, total = rec.run(tool, "TreatExpressData", size,
+                                                lambda: order_check.TreatExpressData(rows))
+    rec.run(tool, "SummariseByBarcode", size,
+            lambda: order_check.SummariseByBarcode(express_data))
+    summary = rec.run(tool, "SummariseByBarcodeFrame", size,
+                      lambda: order_check.SummariseByBarcodeFrame(express_data))
+
+    stock_file = rec.run(tool, "generate stock master", size,
+                         lambda: synthetic.stock_workbook(size, seed=size), workbook=True)
+
+    # One stock read per data_cols layout: [2, 3, 6], [2, 3, 4, 6], [2, 3, 4, 5]
+    stock = {}
+    for sheet, option in ((0, None), (1, "AS"), (4, "MR")):
+        stock[sheet, option] = rec.run(
+            tool, f"GetStockData[{sheet}/{option}]", size,
+            lambda: order_check.GetStockData(stock_file, sheet, option), workbook=True,
+        )
+
+    def Stock(sheet, option):
+        """Parsed stock rows, or generated ones when the read was skipped."""
+        rows = stock.get((sheet, option))
+        if rows is None:
+            rows = synthetic.stock_rows(size, n_cols=3 if option is None else 4, seed=size)
+        return rows
+
+    wb = rec.run(tool, "BuildThaiNameBody", size,
+                 lambda: order_check.BuildThaiNameBody(summary, bill_numbers, total, Stock(0, None)),
+                 workbook=True)
+    if wb is not None:
+        rec.run(tool, "save[ร้านย่อย]", size, lambda: SaveToBytes(wb), workbook=True)
+
+    for customer, template in order_check.TEMPLATES.items():
+        for sheet in template["sheets"]:
+            option = None if sheet == "GL" else "AS"
+            wb = rec.run(
+                tool, f"WriteExcelMainData[{customer}/{sheet}]", size,
+                lambda: order_check.BuildTemplateReport(
+                    order_check.LoadTemplate(customer, sheet), customer, "01.01.2569", "02.01.2569",
+                    summary, bill_numbers, total, Stock(0, option) if option is None else Stock(1, option),
+                ),
+                workbook=True,
+            )
+            if wb is not None:
+                rec.run(tool, f"save[{customer}/{sheet}]", size, lambda: SaveToBytes(wb), workbook=True)
+
+
+def BenchPriceChecker(rec, size, page):
+    tool = "product_price_checker"
+
+    left_file = rec.run(tool, "generate 42C-R1 report", size,
+                        lambda: synthetic.price_report_workbook(size, seed=size), workbook=True)
+    right_file = rec.run(tool, "generate update price list", size,
+                         lambda: synthetic.price_update_workbook(size, seed=size), workbook=True)
+    if left_file is None or right_file is None:
+        return
+
+    left_df = rec.run(tool, "read_any_table", size, lambda: page.read_any_table(left_file), workbook=True)
+    update_list = rec.run(tool, "load_update_price_list", size,
+                          lambda: page.load_update_price_list(right_file), workbook=True)
+    if update_list is None:
+        return
+    right_df = update_list["table"]
+
+    barcodes = [line.split("  ")[1] for line in synthetic.price_report_lines(size, seed=size) if line[0].isdigit()]
+    rec.run(tool, "clean_barcode", len(barcodes), lambda: [page.clean_barcode(b) for b in barcodes])
+
+    left_table = rec.run(tool, "parse_left_report", size, lambda: page.parse_left_report(left_df))
+    matched = rec.run(tool, "find_unmatched_and_outdated", size,
+                      lambda: page.find_unmatched_and_outdated(left_table, right_df))
+    if matched is not None:
+        rec.run(tool, "load_formula_sheet", size,
+                lambda: page.load_formula_sheet(update_list), workbook=True)
+        rec.run(tool, "build_result_workbook", size,
+                lambda: page.build_result_workbook(update_list, *matched), workbook=True)
+        rec.run(tool, "build_filtered_workbook", size,
+                lambda: page.build_filtered_workbook(update_list, *matched), workbook=True)
+
+
+def BenchPictureInserter(rec, size, page, max_images):
+    tool = "insert_product_picture"
+    n_products = min(size, max_images)
+
+    files = rec.run(tool, "generate image workbooks", n_products,
+                    lambda: synthetic.image_workbooks(n_products, seed=size), workbook=True)
+    if files is None:
+        return
+    template_file, images_file = files
+
+    def Load():
+        template_file.seek(0)
+        images_file.seek(0)
+        return load_workbook(template_file).active, load_workbook(images_file).active
+
+    template_ws, images_ws = rec.run(tool, "load workbooks", n_products, Load)
+    rec.run(tool, "insert_product_images", n_products,
+            lambda: page.insert_product_images(template_ws, images_ws))
+    rec.run(tool, "save", n_products, lambda: SaveToBytes(template_ws.parent))
+
+
+def GitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--tools", nargs="+", default=["order_check", "product_price_checker", "insert_product_picture"])
+    parser.add_argument("--max-workbook-rows", type=int, default=100_000)
+    parser.add_argument("--max-images", type=int, default=2_000,
+                        help="cap on the products of the image workbook")
+    parser.add_argument("--budget", type=float, default=60.0,
+                        help="seconds after which a stage is not repeated at larger sizes")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    # Templates and the stock index are resolved from the repository root
+    os.chdir(ROOT)
+
+    commit = GitCommit()
+    started = datetime.now(timezone.utc)
+    rec = Recorder(args.max_workbook_rows, args.budget)
+
+    price_page = LoadPage("product_price_checker") if "product_price_checker" in args.tools else None
+    picture_page = LoadPage("insert_product_picture") if "insert_product_picture" in args.tools else None
+
+    for size in sorted(args.sizes):
+        print(f"{size:,} rows")
+        if "order_check" in args.tools:
+            BenchOrderCheck(rec, size)
+        if price_page is not None:
+            BenchPriceChecker(rec, size, price_page)
+        if picture_page is not None:
+            BenchPictureInserter(rec, size, picture_page, args.max_images)
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"{commit or 'unknown'}-{started:%Y%m%dT%H%M%SZ}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "started": started.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sorted(args.sizes),
+            "settings": {
+                "max_workbook_rows": args.max_workbook_rows,
+                "max_images": args.max_images,
+                "budget": args.budget,
+            },
+            "results": rec.results,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Check SummariseByBarcodeFrame, the SummariseByBarcode result as the frame
+the writers read, against the list of dicts on treated synthetic reports,
+and time both.
+
+    python -m benchmarks.summarise [--sizes 1000 10000 ...]
+"""
+import argparse
+import time
+
+from order_check import SummariseByBarcode, SummariseByBarcodeFrame, TreatExpressData
+from benchmarks.synthetic import express_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows, _, _ = TreatExpressData(express_rows(size, seed=size))
+
+        start = time.perf_counter()
+        expected = SummariseByBarcode(rows)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        frame = SummariseByBarcodeFrame(rows)
+        frame_time = time.perf_counter() - start
+
+        assert frame.to_dict("records") == expected, f"summary frame differs at {size} lines"
+        print(f"{size:>9,} lines  {len(frame):>7,} barcodes  "
+              f"loop {loop_time:7.3f}s  frame {frame_time:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Synthetic inputs shaped like the real uploads, used by the benchmark scripts.
+"""
+import random
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image
+
+UNITS = ("แพ็ค", "ชิ้น", "กล่อง", "ขวด", "ลัง", "โหล")
+
+
+def express_lines(n_lines, seed=0):
+    """
+    Return the text lines of an Express report body with `n_lines` item
+    lines: bill headers, item lines, the odd page header and the
+    "รวมทั้งสิ้น" footer (followed by trailing junk, like the real export).
+    """
+    rnd = random.Random(seed)
+    lines = []
+    written = 0
+    bill = 0
+
+    while written < n_lines:
+        bill += 1
+        bill_number = f"IV68{bill:06d}"
+        lines.append(f"{bill_number}  17/10/68  C{rnd.randint(1, 999):03d}  ลูกค้า  ทดสอบ  จำกัด")
+
+        for line in range(1, rnd.randint(2, 8)):
+            barcode = rnd.choice((
+                f"885{rnd.randint(0, 5000):010d}",
+                f"885{rnd.randint(0, 5000):010d}",
+                f"885{rnd.randint(0, 5000):010d}",
+                f"{rnd.randint(1000, 9999)}.ABC{rnd.randint(0, 9)}",
+                f"ABC{rnd.randint(0, 99)}",
+            ))
+            qty = rnd.randint(1, 120)
+            lines.append(
+                f"{bill_number}  {line}  {barcode}  IT{rnd.randint(0, 999)}  สินค้าทดสอบ  "
+                f"{qty:,}.{rnd.choice(UNITS)}  12.50  {qty * 12.5:,.2f}"
+            )
+            written += 1
+            if written >= n_lines:
+                break
+
+        if rnd.random() < 0.01:
+            lines.append("หน้า  2  รายงานขาย")
+            lines.append("--------")
+
+    lines.append("รวมทั้งสิ้น  X  Y  123,456.00  Z  W")
+    lines.append("พิมพ์โดย  ADMIN")
+    return lines
+
+
+def express_rows(n_lines, seed=0):
+    """The split rows IterExpressRows yields for express_lines()."""
+    return [line.split() for line in express_lines(n_lines, seed)]
+
+
+def summary_items(n_items, seed=0):
+    """SummariseByBarcode-shaped output with `n_items` barcodes."""
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n_items):
+        barcode = f"885{i:010d}" if rnd.random() > 0.02 else f"0000000000000_ABC{i}"
+        items.append({"barcode": barcode, "sum_qty": float(rnd.randint(1, 500))})
+    return items
+
+
+def summary_frame(n_items, seed=0):
+    """summary_items() as the barcode/sum_qty frame the writers consume."""
+    return pd.DataFrame(summary_items(n_items, seed), columns=["barcode", "sum_qty"])
+
+
+def stock_rows(n_rows, n_cols=3, seed=0):
+    """
+    GetStockData-shaped rows: barcode first, stock last, with n_cols
+    columns in total (3 for the [2, 3, 6] layout, 4 for the others).
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        row = [f"885{i:010d}", f"สินค้าทดสอบ รุ่น {i}"]
+        if n_cols == 4:
+            row.append(f"CODE-{i}")
+        row.append(rnd.randint(0, 999))
+        rows.append(row)
+    return rows
+
+
+def express_workbook(n_lines, seed=0):
+    """
+    An Express export holding express_lines(): a title, the column header
+    between two dashed separators, then one text cell per line.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["บริษัท ทดสอบ จำกัด  รายงานขายแยกตามบิล"])
+    ws.append(["-" * 80])
+    ws.append(["เลขที่บิล  ลำดับ  บาร์โค้ด  รหัสสินค้า  ชื่อสินค้า  จำนวน  ราคา  จำนวนเงิน"])
+    ws.append(["-" * 80])
+    for line in express_lines(n_lines, seed):
+        ws.append([line])
+    return SaveWorkbook(wb)
+
+
+def stock_workbook(n_rows, sheets=(0, 1, 4), seed=0):
+    """
+    A stock master whose listed sheets hold n_rows products under a header
+    row, laid out so every GetStockLayout data_cols choice reads them:
+    B barcode, C name, D code, E and F stock, G pack size. Other sheets
+    up to the last listed one are left empty.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+
+    for index in range(max(sheets) + 1):
+        ws = wb.create_sheet(f"S{index}")
+        if index not in sheets:
+            continue
+
+        ws.append(["", "บาร์โค้ด", "ชื่อสินค้า", "รหัส", "STOCK", "STOCK", "แพ็ค"])
+        for i in range(n_rows):
+            ws.append([
+                None, f"885{i:010d}", f"สินค้าทดสอบ รุ่น {i}", f"CODE-{i}",
+                rnd.randint(0, 999), rnd.randint(0, 999), rnd.choice((6, 12, 24)),
+            ])
+
+    return SaveWorkbook(wb)
+
+
+def price_report_lines(n_rows, seed=0):
+    """
+    Lines of the 42C-R1 price report: running number, barcode (with the
+    'No' prefixes, odd spaces and Thai/slash suffixes the cleaner strips),
+    name and unit price, with page headers and a few lines that have a
+    text fourth column so the price comes from the fifth.
+    """
+    rnd = random.Random(seed)
+    lines = []
+
+    for i in range(1, n_rows + 1):
+        if i % 50 == 1:
+            lines.append("รายงานราคาสินค้า  42C-R1")
+            lines.append("ลำดับ  บาร์โค้ด  ชื่อสินค้า  ราคา")
+
+        barcode = rnd.choice((
+            f"885{i:010d}",
+            f"885{i:010d}",
+            f"No{i:08d}",
+            f"885{i:010d}\u00a0ชิ้น",
+            f"885{i:010d}/A",
+            f"(885{i:010d})",
+        ))
+        price = f"{rnd.randint(1, 9999) / 4:,.2f}"
+
+        if rnd.random() < 0.05:
+            lines.append(f"{i}  {barcode}  สินค้า {i}  ราคาพิเศษ  {price}")
+        else:
+            lines.append(f"{i}  {barcode}  สินค้า {i}  {price}  บาท")
+
+    return lines
+
+
+def price_report_workbook(n_rows, seed=0):
+    """price_report_lines() as the one column workbook the page reads."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for line in price_report_lines(n_rows, seed):
+        ws.append([line])
+    return SaveWorkbook(wb, "price_report.xlsx")
+
+
+def price_update_workbook(n_rows, seed=0):
+    """
+    The update price list: a header row, then barcode, name, unit and
+    price. About a tenth of the barcodes are not in the report and a fifth
+    of the prices differ from it.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["บาร์โค้ด", "ชื่อสินค้า", "หน่วย", "ราคา"])
+
+    for i in range(1, n_rows + 1):
+        barcode = f"885{i:010d}" if rnd.random() > 0.1 else f"999{i:010d}"
+        price = rnd.randint(1, 9999) / 4
+        ws.append([barcode, f"สินค้า {i}", "ชิ้น", f"{price:.2f}"])
+
+    return SaveWorkbook(wb, "price_update.xlsx")
+
+
+def image_workbooks(n_products, seed=0):
+    """
+    (template, product images) workbooks for insert_product_picture.py:
+    the images workbook lists n_products product numbers in column C from
+    row 3 with a picture anchored in column B of the same row, the template
+    asks for five of them in A9:A13.
+    """
+    rnd = random.Random(seed)
+
+    images_wb = Workbook()
+    images_ws = images_wb.active
+    for product in range(n_products):
+        row = product + 3
+        images_ws[f"C{row}"] = f"P{product:06d}"
+
+        picture = BytesIO()
+        Image.new("RGB", (40, 30), (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))).save(picture, format="PNG")
+        images_ws.add_image(XLImage(picture), f"B{row}")
+
+    template_wb = Workbook()
+    template_ws = template_wb.active
+    for row in range(9, 14):
+        template_ws[f"A{row}"] = f"P{rnd.randrange(n_products):06d}"
+        template_ws.row_dimensions[row].height = 60
+
+    return SaveWorkbook(template_wb, "template.xlsx"), SaveWorkbook(images_wb, "images.xlsx")
+
+
+def SaveWorkbook(wb, name="synthetic.xlsx"):
+    """Save to a BytesIO named like an upload (read_any_table looks at .name)."""
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    output.name = name
+    return output
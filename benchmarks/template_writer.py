@@ -0,0 +1,201 @@
+"""
+Time WriteExcelMainData on the bundled GBH.xlsx/DH.xlsx/HP.xlsx templates
+against the previous writer, which copied every style object per cell.
+
+    python -m benchmarks.template_writer [--rows 20000]
+"""
+import argparse
+import time
+from copy import copy
+
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from order_check import (
+    BORDER, ERROR_HIGHLIGHT, TEMPLATES, SafeInt, LoadTemplate, WriteExcelMainData,
+)
+from benchmarks.synthetic import summary_items, summary_frame, stock_rows
+
+
+def LegacyGetLastRealRow(ws, col=1):
+    row = ws.max_row
+    while row > 0 and ws.cell(row=row, column=col).value is None:
+        row -= 1
+    return row
+
+
+def LegacyGetLastRealCol(ws):
+    col = ws.max_column
+    while col > 0 and ws.cell(row=LegacyGetLastRealRow(ws), column=col).value is None:
+        col -= 1
+    return col
+
+
+def LegacyCaptureColumnStyles(ws, style_row):
+    styles = {}
+    max_column = LegacyGetLastRealCol(ws)
+    for col in range(1, max_column + 1):
+        cell = ws.cell(row=style_row, column=col)
+        styles[col] = {
+            "font": copy(cell.font),
+            "border": copy(cell.border),
+            "fill": copy(cell.fill),
+            "number_format": cell.number_format,
+            "alignment": copy(cell.alignment),
+            "protection": copy(cell.protection),
+        }
+    return styles
+
+
+def LegacyApplyColumnStyleToCell(cell, style):
+    cell.font = copy(style["font"])
+    cell.border = copy(style["border"])
+    cell.fill = copy(style["fill"])
+    cell.number_format = style["number_format"]
+    cell.alignment = copy(style["alignment"])
+    cell.protection = copy(style["protection"])
+    cell.border = BORDER
+
+
+def LegacyAutoResizeColumn(ws, col, start_row=1, end_row=None,
+                           padding=2, min_width=8, max_width=50):
+    if end_row is None:
+        end_row = ws.max_row
+
+    max_width_est = 0
+    merged_ranges = ws.merged_cells.ranges
+    col_letter = get_column_letter(col)
+
+    for row in range(start_row, end_row + 1):
+        coord = f"{col_letter}{row}"
+
+        skip = False
+        for merged in merged_ranges:
+            if coord in merged and not (row == merged.min_row and col == merged.min_col):
+                skip = True
+                break
+        if skip:
+            continue
+
+        cell = ws.cell(row=row, column=col)
+        if not cell.value:
+            continue
+
+        text = str(cell.value)
+        font_size = cell.font.sz or 11
+        scale = font_size / 11
+
+        est = int(len(text) * scale) + padding
+        max_width_est = max(max_width_est, est)
+
+    final_width = max(min_width, min(max_width_est, max_width))
+    ws.column_dimensions[col_letter].width = final_width
+
+
+def LegacyWriteExcelMainData(wb, express_data, stock_data):
+    """WriteExcelMainData as it was before style-prototype row cloning."""
+    ws = wb.active
+
+    header_end_row = LegacyGetLastRealRow(ws)
+    stock_col =  8 if any(
+        isinstance(ws.cell(row=header_end_row, column=col).value, str)
+        and "stock" in ws.cell(row=header_end_row, column=col).value.lower()
+        for col in range(1, ws.max_column + 1)
+    ) else 7
+
+    stock_lookup = {}
+    for s in stock_data:
+        barcode = SafeInt(s[0])
+        if not barcode:
+            continue
+
+        stock_lookup[barcode] = (
+            s[1],
+            s[2] if len(s) >= 4 else None,
+            s[-1],
+        )
+
+    column_styles = LegacyCaptureColumnStyles(ws, header_end_row+1)
+    sum = 0.0
+
+    for idx, item in enumerate(express_data, start = 1):
+        write_row = header_end_row + idx
+
+        index_cell = ws.cell(row=write_row, column = 1)
+        barcode_cell = ws.cell(row=write_row, column=2)
+        detail_cell = ws.cell(row=write_row, column=3)
+        addition_info_cell = ws.cell(row=write_row, column=4)
+        amount_cell = ws.cell(row=write_row, column=5)
+        stock_cell = ws.cell(row=write_row, column=stock_col)
+
+        for col, style in column_styles.items():
+            LegacyApplyColumnStyleToCell(ws.cell(write_row, col), style)
+
+        index_cell.value = idx
+        amount_cell.value = item["sum_qty"]
+        sum += item["sum_qty"]
+
+        barcode = item.get("barcode", "")
+        if "_" in barcode:
+            barcode_cell.value, detail_cell.value = barcode.split("_", 1)
+            barcode_cell.fill = ERROR_HIGHLIGHT
+            continue
+
+        barcode_cell.value = barcode
+        stock_item = stock_lookup.pop(SafeInt(barcode), None)
+
+        if stock_item is not None:
+            detail, info, stock = stock_item
+            detail_cell.value = detail
+            stock_cell.value = stock
+
+            if info is not None:
+                addition_info_cell.value = info
+        else:
+            detail_cell.value = "Cannot find the barcode.\nUpdate the main sheet."
+            detail_cell.fill = ERROR_HIGHLIGHT
+
+    cell = ws[f"E{LegacyGetLastRealRow(ws)+1}"]
+    cell.value = sum
+    cell.font = copy(ws[f"E{LegacyGetLastRealRow(ws)}"].font) + Font(bold=True)
+    cell.fill = PatternFill(
+        fill_type="solid",
+        start_color="FFFF00",
+        end_color="FFFF00",
+    )
+
+    LegacyAutoResizeColumn(ws, 3, end_row=LegacyGetLastRealRow(ws)-1, padding=0, max_width=90)
+
+    return wb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    # The legacy writer takes the list of dicts, the current one the frame
+    items = summary_items(args.rows)
+    frame = summary_frame(args.rows)
+
+    for file_choice, template in TEMPLATES.items():
+        for sheet in template["sheets"]:
+            n_cols = 3 if sheet == "GL" else 4
+            stock = stock_rows(int(args.rows * 0.9), n_cols=n_cols)
+
+            timings = []
+            for writer, data in ((LegacyWriteExcelMainData, items), (WriteExcelMainData, frame)):
+                wb = LoadTemplate(file_choice, sheet)
+                start = time.perf_counter()
+                writer(wb, data, stock)
+                timings.append(time.perf_counter() - start)
+
+            legacy_time, new_time = timings
+            print(
+                f"{file_choice}/{sheet:<3} {args.rows:,} rows  per-cell copies {legacy_time:7.3f}s"
+                f"  row cloning {new_time:7.3f}s  x{legacy_time / new_time:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Check the single pass TreatExpressData against the previous quadratic
+implementation on generated reports and time both.
+
+    python -m benchmarks.treat_express_data [--sizes 1000 10000 ...] [--max-legacy-rows N]
+
+The quadratic implementation is skipped above --max-legacy-rows. The quick
+equality check runs with the tests (tests/test_treat_express_data.py).
+"""
+import argparse
+import copy
+import re
+import time
+
+from order_check import TreatExpressData, has_thai
+from benchmarks.synthetic import express_rows
+
+
+def LegacyTreatExpressData(data):
+    """TreatExpressData as it was before the single pass rewrite."""
+    bill_number = ""
+    bill_number_collection = []
+    index = 0
+
+    for row in data:
+        if len(row) < 3:
+            continue
+
+        third = str(row[2]).strip()
+
+        if third.isdigit():
+            continue
+
+        if "." in third:
+            left, _, right = third.partition(".")
+
+            if left.isdigit() and right and not right.isdigit():
+                row[2] = left
+                row.insert(3, right)
+                continue
+
+        if not third.isdigit():
+            row[2] = "0000000000000_"+ third
+            row.insert(3, third)
+
+    while (index < len(data) and data[index][0] != "รวมทั้งสิ้น"):
+        if len(data[index]) < 5 or has_thai(data[index][0]):
+            del data[index]
+            continue
+
+        checking_bill = data[index][0]
+        checking_bill = re.sub(r'[^A-Za-z0-9]', '', checking_bill)
+
+        if (checking_bill != bill_number):
+            bill_number = checking_bill
+            bill_number_collection.append(bill_number)
+            del data[index]
+            index -= 1
+
+        index += 1
+
+    if (data[index][0] == "รวมทั้งสิ้น"):
+            total = (data[index][-3])
+            data = data[0 : index]
+            return data, bill_number_collection, total
+
+    raise ValueError("Cannot find รวมทั้งสิ้น, check the input file.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-legacy-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows = express_rows(size, seed=size)
+        legacy_rows = copy.deepcopy(rows) if size <= args.max_legacy_rows else None
+
+        start = time.perf_counter()
+        result = TreatExpressData(iter(rows))
+        new_time = time.perf_counter() - start
+        line = f"{size:>9,} lines  single pass {new_time:8.3f}s"
+
+        if legacy_rows is not None:
+            start = time.perf_counter()
+            expected = LegacyTreatExpressData(legacy_rows)
+            legacy_time = time.perf_counter() - start
+
+            assert result == expected, f"TreatExpressData differs from legacy at {size} lines"
+            line += f"  legacy {legacy_time:8.3f}s  same output"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
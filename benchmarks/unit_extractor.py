@@ -0,0 +1,69 @@
+"""
+Check the compiled unit-suffix extractor against the previous suffix loop
+and compare their throughput on synthetic Express cells.
+
+    python -m benchmarks.unit_extractor [--cells 1000000]
+"""
+import argparse
+import time
+
+from order_check import ExtractPackQtyFromRow
+from benchmarks.synthetic import express_rows
+
+
+def LegacyExtractPackQtyFromRow(row):
+    """ExtractPackQtyFromRow as it was before the compiled matcher."""
+    qty = 0.0
+    suffixes = (
+        ".แพ็ค", ".ชิ้น", ".อัน", ".ชุด", ".แผ่น",
+        ".กล่อง", ".ถุง", ".ม้วน", ".ลัง", ".แผง", ".คู่",
+        ".เครื่อง", ".ขวด", ".กระป๋อง", ".เส้น", ".ตัว", ".ใบ",
+        ".เมตร", ".ลูก", ".โหล", ".ดวง"
+    )
+
+    found = False
+    for cell in row:
+        if isinstance(cell, str) and any(suffix in cell for suffix in suffixes):
+            for suffix in suffixes:
+                if suffix in cell:
+                    before = cell.split(suffix)[0].strip()
+                    break
+
+            before = before.replace(",", "")
+            if not before:
+                continue
+
+            qty += float(before)
+            found = True
+
+    if not found:
+        raise ValueError("Self Defined Error 10010: No valid suffix found in this row!")
+
+    return qty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cells", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Item lines only, roughly 8 cells each
+    rows = [row for row in express_rows(args.cells // 8) if len(row) == 8 and row[1].isdigit()]
+    n_cells = sum(len(row) for row in rows)
+
+    start = time.perf_counter()
+    expected = [LegacyExtractPackQtyFromRow(row) for row in rows]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = [ExtractPackQtyFromRow(row) for row in rows]
+    new_time = time.perf_counter() - start
+
+    assert result == expected, "compiled extractor differs from the suffix loop"
+    print(f"{n_cells:,} cells in {len(rows):,} rows, same quantities")
+    print(f"  suffix loop     {legacy_time:7.3f}s  {n_cells / legacy_time / 1e6:6.2f} M cells/s")
+    print(f"  compiled regex  {new_time:7.3f}s  {n_cells / new_time / 1e6:6.2f} M cells/s")
+
+
+if __name__ == "__main__":
+    main()
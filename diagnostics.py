@@ -0,0 +1,252 @@
+"""
+Per-stage timing and memory of a script run, for order_check.py and the pages.
+
+    StartDiagnostics("order_check")         # top of the script
+    with Stage("GetExpressData", rows_in=len(files)) as stage:
+        data = ...
+        stage["rows_out"] = len(data)
+    ShowDiagnostics()                       # bottom of the script
+
+Recording is switched on by the toggle of the diagnostics panel (or the
+REPORT_DIAGNOSTICS=1 environment variable). When it is off, Stage() only
+checks a context variable and yields a throwaway dict.
+
+Work Streamlit runs after the script, like the data callable of a deferred
+st.download_button, is wrapped with DeferStages and logged as a run of its
+own.
+
+tracemalloc is process wide, so one run records at a time: a run that
+starts while another session is recording is not recorded.
+"""
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from threading import Lock, current_thread
+
+import streamlit as st
+
+DIAGNOSTICS_LOG_PATH = os.path.join(".cache", "diagnostics.jsonl")
+
+DIAGNOSTICS_DEFAULT = os.environ.get("REPORT_DIAGNOSTICS") == "1"
+
+# The run being recorded: {"page", "started", "stages", "open"}, None when off.
+# Streamlit runs every session on its own thread, a context variable keeps
+# them apart.
+CURRENT_RUN = ContextVar("diagnostics_run", default=None)
+
+# Set when this script run wanted to record but another run was recording.
+RUN_SKIPPED = ContextVar("diagnostics_skipped", default=False)
+
+# The run being recorded, by the thread running it; at most one. tracemalloc
+# is process wide, it runs while that run is open.
+TRACING = {"runs": {}, "lock": Lock()}
+
+def StartDiagnostics(page):
+    """
+    Begin recording the stages of this script run if diagnostics are on.
+    """
+    CloseAbandonedRuns()
+    RUN_SKIPPED.set(False)
+
+    if not st.session_state.get("diagnostics", DIAGNOSTICS_DEFAULT):
+        return
+
+    RUN_SKIPPED.set(not BeginRun(page))
+
+def BeginRun(page):
+    """
+    Start recording on this thread. Returns False, recording nothing, when
+    another run is recording: its peaks would mix with this one's.
+    """
+    with TRACING["lock"]:
+        if TRACING["runs"]:
+            return False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        run = TRACING["runs"][current_thread()] = {
+            "page": page,
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "stages": [],
+            "open": [],
+        }
+
+    CURRENT_RUN.set(run)
+    return True
+
+def FinishRun():
+    """
+    End the run of this thread, if any, and append it to the log.
+    """
+    run = CURRENT_RUN.get()
+    CURRENT_RUN.set(None)
+    if run is None:
+        return None
+
+    with TRACING["lock"]:
+        if TRACING["runs"].pop(current_thread(), None) is not None:
+            tracemalloc.stop()
+
+    if run["stages"]:
+        WriteDiagnosticsLog(run)
+    return run
+
+def CloseAbandonedRuns():
+    """
+    End the runs that never reached ShowDiagnostics: the one this thread
+    left behind (st.rerun) and those of finished threads (a script run that
+    raised). They are logged as unfinished.
+    """
+    thread = current_thread()
+
+    with TRACING["lock"]:
+        abandoned = [
+            TRACING["runs"].pop(owner) for owner in list(TRACING["runs"])
+            if owner is thread or not owner.is_alive()
+        ]
+        if abandoned and not TRACING["runs"]:
+            tracemalloc.stop()
+
+    CURRENT_RUN.set(None)
+
+    for run in abandoned:
+        if run["stages"]:
+            run["unfinished"] = True
+            WriteDiagnosticsLog(run)
+
+def DeferStages(page, func):
+    """
+    Wrap func, called by Streamlit outside the script run, so that its
+    stages are recorded as a run of their own when this run is recorded
+    and no other run is recording by then. Such a run only goes to the
+    log, the panel is already drawn.
+    """
+    if CURRENT_RUN.get() is None:
+        return func
+
+    def Recorded():
+        if not BeginRun(page):
+            return func()
+        try:
+            return func()
+        finally:
+            FinishRun()
+
+    return Recorded
+
+@contextmanager
+def Stage(name, rows_in=None):
+    """
+    Time the block and record its peak memory above the start, rows in and
+    out and cache status. The yielded dict takes "rows_out" and any other
+    field the block wants to report.
+    """
+    run = CURRENT_RUN.get()
+    if run is None:
+        yield {}
+        return
+
+    stage = {"stage": name, "depth": len(run["open"]), "rows_in": rows_in}
+    run["stages"].append(stage)
+
+    # A nested stage resets the peak, keep what the outer one saw so far.
+    # No other run is recording, nobody else reads the peak.
+    current, peak = tracemalloc.get_traced_memory()
+    for outer in run["open"]:
+        outer["_peak"] = max(outer["_peak"], peak)
+    tracemalloc.reset_peak()
+
+    stage["_start_memory"] = current
+    stage["_peak"] = current
+    run["open"].append(stage)
+    start = time.perf_counter()
+
+    try:
+        yield stage
+    except BaseException as e:
+        stage["error"] = type(e).__name__
+        raise
+    finally:
+        stage["seconds"] = round(time.perf_counter() - start, 4)
+        run["open"].pop()
+
+        peak = max(stage.pop("_peak"), tracemalloc.get_traced_memory()[1])
+        stage["peak_mb"] = round((peak - stage.pop("_start_memory")) / 2**20, 2)
+        for outer in run["open"]:
+            outer["_peak"] = max(outer["_peak"], peak)
+
+def NoteStage(**fields):
+    """
+    Add fields (e.g. cache="hit") to the innermost open stage, if recording.
+    """
+    run = CURRENT_RUN.get()
+    if run is not None and run["open"]:
+        run["open"][-1].update(fields)
+
+def ShowDiagnostics():
+    """
+    Collapsible panel with the stages of this run and the on/off toggle.
+    A recorded run is also appended to DIAGNOSTICS_LOG_PATH.
+    """
+    run = FinishRun()
+
+    with st.expander("Diagnostics"):
+        st.toggle(
+            "Record stage timings and memory",
+            key="diagnostics",
+            value=DIAGNOSTICS_DEFAULT,
+            help=(
+                f"Takes effect from the next run. Runs are also appended to {DIAGNOSTICS_LOG_PATH}, "
+                "so are the downloads, which are saved after the page is drawn. "
+                "Only one run records at a time: while another session is recording, "
+                "this one is not recorded."
+            ),
+        )
+
+        if RUN_SKIPPED.get():
+            st.caption("Another session was recording, this run was not recorded.")
+            return
+        if run is None:
+            return
+        if not run["stages"]:
+            st.caption("No stage ran in this run.")
+            return
+
+        st.dataframe(
+            [
+                {
+                    "stage": "    " * stage["depth"] + stage["stage"],
+                    "seconds": stage["seconds"],
+                    "peak MB": stage["peak_mb"],
+                    "rows in": stage["rows_in"],
+                    "rows out": stage.get("rows_out"),
+                    "cache": stage.get("cache"),
+                    "error": stage.get("error"),
+                }
+                for stage in run["stages"]
+            ],
+            hide_index=True,
+        )
+
+def WriteDiagnosticsLog(run):
+    """
+    Append the run as one JSON line. A log that cannot be written never
+    breaks the page.
+    """
+    record = {
+        "page": run["page"],
+        "started": run["started"],
+        "stages": run["stages"],
+    }
+    if run.get("unfinished"):
+        record["unfinished"] = True
+
+    try:
+        os.makedirs(os.path.dirname(DIAGNOSTICS_LOG_PATH), exist_ok=True)
+        with open(DIAGNOSTICS_LOG_PATH, "a", encoding="utf-8") as log:
+            log.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    except OSError:
+        pass
@@ -1,14 +1,30 @@
 import re
+import os
+import json
+import sqlite3
+import hashlib
+import numpy as np
+import pandas as pd
+from bisect import bisect_right
 import streamlit as st
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import Cell, MergedCell, WriteOnlyCell
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.styles import Border, Side
+from openpyxl.styles.cell_style import StyleArray
 from io import BytesIO
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from zoneinfo import ZoneInfo
 from collections import OrderedDict
-from copy import copy
+from contextlib import contextmanager
+from copy import copy, deepcopy
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from weakref import WeakKeyDictionary
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from diagnostics import StartDiagnostics, ShowDiagnostics, Stage, NoteStage, DeferStages
 
 CENTER = Alignment(horizontal="center", vertical="center")
 
@@ -24,7 +40,95 @@ ERROR_HIGHLIGHT = PatternFill(
     end_color="FF4A0B",
 )
 
+def SolidFill(color):
+    return PatternFill(
+        fill_type="solid",
+        start_color=color,
+        end_color=color,
+    )
+
+# Every style combination the ร้านย่อย report uses. RegisterStyle interns a
+# combination in the workbook once and ApplyStyle stamps it onto cells.
+CELL_STYLES = {
+    "title": {"font": Font(size=32, color="6600CC"), "fill": SolidFill("FFAAFF"), "alignment": CENTER},
+    "bill_label": {"font": Font(size=13, bold=True, color="9933FF"), "fill": SolidFill("E2EFDA")},
+    "bill_range": {"font": Font(size=20, color="0000FF"), "fill": SolidFill("E2EFDA")},
+    "time": {"font": Font(size=14, color="000000"), "fill": SolidFill("FFC000"), "alignment": CENTER},
+    "date": {"font": Font(size=16, color="FF0000"), "fill": SolidFill("FCE4D6")},
+    "branch": {"font": Font(size=18, color="CC00FF"), "fill": SolidFill("FFCCFF")},
+    "version": {"font": Font(size=21, bold=True, color="0000FF"), "fill": SolidFill("97DCFF"), "alignment": CENTER},
+    "total": {"font": Font(size=16, color="0066FF"), "fill": SolidFill("CCCCFF")},
+    "bill_count": {"font": Font(size=14, color="FF0066"), "fill": SolidFill("E2EFDA")},
+    "column_header": {"font": Font(size=12, bold=True), "alignment": CENTER},
+    "body": {"font": Font(size=12), "alignment": CENTER, "border": BORDER},
+    "body_error": {"font": Font(size=12), "alignment": CENTER, "fill": ERROR_HIGHLIGHT, "border": BORDER},
+    "body_empty": {"border": BORDER},
+}
+
+# Last column (G) of the ร้านย่อย report
+REPORT_LAST_COLUMN = 7
+
+NON_ALPHANUMERIC = re.compile(r'[^A-Za-z0-9]')
+
+UNIT_SUFFIXES = (
+    "แพ็ค", "ชิ้น", "อัน", "ชุด", "แผ่น",
+    "กล่อง", "ถุง", "ม้วน", "ลัง", "แผง", "คู่",
+    "เครื่อง", "ขวด", "กระป๋อง", "เส้น", "ตัว", "ใบ",
+    "เมตร", "ลูก", "โหล", "ดวง"
+)
+
+# '55.แพ็ค' -> unit 'แพ็ค', the quantity is everything before the match
+UNIT_SUFFIX_PATTERN = re.compile(r"\.(" + "|".join(map(re.escape, UNIT_SUFFIXES)) + ")")
+
+# Per column interval index of merged ranges (see GetMergedCellIndex)
+MERGED_CELL_INDEXES = WeakKeyDictionary()
+
+# Last real row/column per worksheet (see GetSheetExtent)
+SHEET_EXTENTS = WeakKeyDictionary()
+
+# Widest first line seen per column, fed by the writers (see TrackColumnWidth)
+COLUMN_WIDTHS = WeakKeyDictionary()
+
+# Compiled layout of the template a worksheet was loaded from (see GetTemplatePlan)
+TEMPLATE_PLANS = WeakKeyDictionary()
+
+# Entry-bounded, not byte-bounded: a parsed upload is kept whatever its size
+PARSE_CACHE_MAX_ENTRIES = 8
+
+# Serialized reports kept for download (see DownloadFile)
+REPORT_CACHE_MAX_ENTRIES = 4
+
+# Upload digests remembered per session, by UploadedFile.file_id (see FileDigest)
+FILE_DIGEST_MEMO_ENTRIES = 32
+
+# From this many barcodes on, the ร้านย่อย report is streamed through a
+# write-only workbook (StreamThaiNameReport) instead of kept in memory
+STREAMING_REPORT_MIN_ROWS = 100_000
+
+STOCK_INDEX_PATH = os.path.join(".cache", "stock_index.sqlite")
+
+# Schema of the stock index, an older file is rebuilt (2: JSON row payloads)
+STOCK_INDEX_VERSION = 2
+
+# Stock workbook sheet read for each customer (see GetStockLayout)
+STOCK_SHEETS = {"ร้านย่อย": 0, "GBH": 1, "DH": 4, "HP": 5}
+
+TEMPLATES = {
+    "GBH": {"path": "template file/GBH.xlsx", "sheets": ["AS", "GL"]},
+    "DH": {"path": "template file/DH.xlsx", "sheets": ["GL", "MR"]},
+    "HP": {"path": "template file/HP.xlsx", "sheets": ["HP"]}
+}
+
+# Cells the form fields are written to, patched on a cached report body
+REPORT_HEADER_CELLS = {
+    "ร้านย่อย": ["A1", "E2", "F2", "A3", "F3"],
+    "GBH": ["F2", "G2", "A3"],
+    "DH": ["I1", "A2", "E2", "A3", "E3", "A4"],
+    "HP": ["A1", "A2"],
+}
+
 def main():
+    StartDiagnostics("order_check")
     st.title("Sales & Stock Reconciliation Report Generator")
     
     st.header("📘 Introduction")
@@ -54,77 +158,283 @@ def main():
         st.divider()
         company_pages[choice]()
 
+    ShowParseCacheStats()
+    ShowDiagnostics()
+
 # region --- Entrance function for different companies with specific programme logic ---
 
 def ThaiName():
-    express_file = st.session_state.get("excel_file_1")
+    express_files = st.session_state.get("excel_file_1")
     stock_file = st.session_state.get("excel_file_2")
 
-    if express_file is not None and stock_file is not None:
-        express_data, bill_numbers, total = GetExpressData(express_file)
-        express_data = SummariseByBarcode(express_data)
-        stock_data = GetStockData(stock_file, 0)
-
-        excel_file = GenerateExcel()
-        excel_file = UpdateUserInputTitle(excel_file)
-        excel_file = GetDateTime(excel_file)
-        excel_file = GetBranchNumberAndVersion(excel_file)
-        excel_file = UpdateBillNumberAndTotalProfit(excel_file, bill_numbers, total)
-        excel_file = WriteMainData(excel_file, express_data, stock_data)
-        excel_file = AdjustExcelColWidthAndAddBorder(excel_file)
-        
-        DownloadFile(excel_file)
+    if express_files and stock_file is not None:
+        header = {"title": GetUserInputTitle()}
+        header["date"], header["time"] = GetDateTime()
+        header["branch_number"], header["version"] = GetBranchNumberAndVersion()
+
+        express_data, bill_numbers, total = GetExpressSummary(express_files)
+        digests = GetUploadDigests()
+
+        def GetStock():
+            return GetCachedStockData(stock_file, STOCK_SHEETS["ร้านย่อย"], None, express_data)
+
+        # Too large to keep as a workbook: stream the whole report on download
+        if len(express_data) >= STREAMING_REPORT_MIN_ROWS:
+            st.session_state.pop("report_body", None)
+
+            def Stream():
+                output_excel_file = BytesIO()
+                with Stage("StreamThaiNameReport", rows_in=len(express_data)):
+                    StreamThaiNameReport(output_excel_file, header, express_data, bill_numbers, total, GetStock())
+                return output_excel_file.getvalue()
+
+            DownloadFile(GetReportFingerprint(digests, "ร้านย่อย", *header.values()), Stream)
+            return
+
+        def Build():
+            return BuildThaiNameBody(express_data, bill_numbers, total, GetStock())
+
+        body = GetReportBody("ร้านย่อย", GetReportFingerprint(digests, "ร้านย่อย"), Build)
+        DownloadFile(
+            GetReportFingerprint(digests, "ร้านย่อย", *header.values()),
+            lambda: SaveReportBody(body, lambda wb: WriteThaiNameHeader(wb, header)),
+        )
 
 def GBH():
-    express_file = st.session_state.get("excel_file_1")
+    express_files = st.session_state.get("excel_file_1")
     stock_file = st.session_state.get("excel_file_2")
 
-    if express_file is not None and stock_file is not None:
+    if express_files and stock_file is not None:
         start_date, end_date = GetUserInputDates()
-        excel_file, option = GetTemplate("GBH")
-    
-        express_data, bill_numbers, total = GetExpressData(express_file)
-        express_data = SummariseByBarcode(express_data)
-        stock_data = GetStockData(stock_file, 1, option)
+        option = GetTemplateSheet("GBH")
 
-        excel_file = WriteGBHFileInformation(excel_file, start_date, end_date, bill_numbers, total)
-        excel_file = WriteGBHFileMainData(excel_file, express_data, stock_data)
-        
-        DownloadFile(excel_file)
+        express_data, bill_numbers, total = GetExpressSummary(express_files)
+        digests = GetUploadDigests()
+
+        def Build():
+            stock_data = GetCachedStockData(stock_file, STOCK_SHEETS["GBH"], option, express_data)
+            return BuildTemplateBody("GBH", option, express_data, stock_data)
+
+        body = GetReportBody("GBH", GetReportFingerprint(digests, "GBH", option), Build)
+        DownloadFile(
+            GetReportFingerprint(digests, "GBH", option, start_date, end_date),
+            lambda: SaveReportBody(
+                body, lambda wb: WriteTemplateHeader(wb, "GBH", start_date, end_date, bill_numbers, total)
+            ),
+        )
 
 def DH():
-    express_file = st.session_state.get("excel_file_1")
+    express_files = st.session_state.get("excel_file_1")
     stock_file = st.session_state.get("excel_file_2")
 
-    if express_file is not None and stock_file is not None:
+    if express_files and stock_file is not None:
         start_date, end_date = GetUserInputDates()
-        excel_file, option = GetTemplate("DH")
+        option = GetTemplateSheet("DH")
 
-        express_data, bill_numbers, total = GetExpressData(express_file)
-        express_data = SummariseByBarcode(express_data)
-        stock_data = GetStockData(stock_file, 4, option)
+        express_data, bill_numbers, total = GetExpressSummary(express_files)
+        digests = GetUploadDigests()
 
-        excel_file = WriteDHFileInformation(excel_file, start_date, end_date, bill_numbers, total)
-        excel_file = WriteDHFileMainData(excel_file, express_data, stock_data)
-        
-        DownloadFile(excel_file)
+        def Build():
+            stock_data = GetCachedStockData(stock_file, STOCK_SHEETS["DH"], option, express_data)
+            return BuildTemplateBody("DH", option, express_data, stock_data)
+
+        body = GetReportBody("DH", GetReportFingerprint(digests, "DH", option), Build)
+        DownloadFile(
+            GetReportFingerprint(digests, "DH", option, start_date, end_date),
+            lambda: SaveReportBody(
+                body, lambda wb: WriteTemplateHeader(wb, "DH", start_date, end_date, bill_numbers, total)
+            ),
+        )
 
 def HP():
-    express_file = st.session_state.get("excel_file_1")
+    express_files = st.session_state.get("excel_file_1")
     stock_file = st.session_state.get("excel_file_2")
 
-    if express_file is not None and stock_file is not None:
+    if express_files and stock_file is not None:
         start_date, end_date = GetUserInputDates()
-        excel_file, option = GetTemplate("HP")
+        option = GetTemplateSheet("HP")
 
-        express_data, bill_numbers, total = GetExpressData(express_file)
-        express_data = SummariseByBarcode(express_data)
-        stock_data = GetStockData(stock_file, 5, option)
+        express_data, bill_numbers, total = GetExpressSummary(express_files)
+        digests = GetUploadDigests()
 
-        excel_file = WriteHPFileInformation(excel_file, start_date, end_date, bill_numbers, total)
-        excel_file = WriteHPFileMainData(excel_file, express_data, stock_data)
-        
-        DownloadFile(excel_file)
+        def Build():
+            stock_data = GetCachedStockData(stock_file, STOCK_SHEETS["HP"], option, express_data)
+            return BuildTemplateBody("HP", option, express_data, stock_data)
+
+        body = GetReportBody("HP", GetReportFingerprint(digests, "HP", option), Build)
+        DownloadFile(
+            GetReportFingerprint(digests, "HP", option, start_date, end_date),
+            lambda: SaveReportBody(
+                body, lambda wb: WriteTemplateHeader(wb, "HP", start_date, end_date, bill_numbers, total)
+            ),
+        )
+
+# endregion
+
+# region --- Report pipeline without user interface (pages and batch_report.py) ---
+
+def ParseReportInputs(express_file, stock_file, customer, option=None):
+    """
+    Parse one Express export and look up its barcodes in the stock file,
+    without Streamlit caching.
+
+    Returns:
+        tuple: (express_data, bill_numbers, total, stock_data)
+    """
+    express_data, bill_numbers, total = GetExpressData(express_file)
+    express_data = SummariseByBarcodeFrame(express_data)
+    total = FormatExpressTotal(total)
+    stock_data = GetIndexedStockData(stock_file, STOCK_SHEETS[customer], option, express_data["barcode"].tolist())
+
+    return express_data, bill_numbers, total, stock_data
+
+def BuildThaiNameReport(header, express_data, bill_numbers, total, stock_data):
+    """
+    ร้านย่อย report from already parsed inputs.
+
+    header holds the values the page asks for: title, date, time,
+    branch_number and version, as the page formats them.
+    """
+    wb = BuildThaiNameBody(express_data, bill_numbers, total, stock_data)
+    return WriteThaiNameHeader(wb, header)
+
+def BuildThaiNameBody(express_data, bill_numbers, total, stock_data):
+    """
+    Everything of the ร้านย่อย report that only depends on the uploads.
+    """
+    with Stage("GenerateExcel"):
+        wb = GenerateExcel()
+        wb = UpdateBillNumberAndTotalProfit(wb, bill_numbers, total)
+
+    with Stage("WriteMainData", rows_in=len(express_data)) as stage:
+        wb = WriteMainData(wb, express_data, stock_data)
+        # One data row per barcode, the header rows are not counted
+        stage["rows_out"] = len(express_data)
+
+    with Stage("AdjustExcelColWidthAndAddBorder"):
+        return AdjustExcelColWidthAndAddBorder(wb)
+
+def StreamThaiNameReport(output, header, express_data, bill_numbers, total, stock_data):
+    """
+    Write the ร้านย่อย report to output (a path or binary file) through a
+    write-only workbook: data rows are serialized as they are produced
+    instead of living as cell objects until the save, so memory stays flat
+    however many rows there are.
+
+    Same content as BuildThaiNameReport. The merged header, frozen panes,
+    borders and error highlight are kept. Column widths have to be set
+    before the first row, so the data rows are generated twice: once to
+    measure them, once to write them.
+    """
+    # The five header rows come from the regular writers on a small workbook
+    header_wb = WriteThaiNameHeader(GenerateExcel(), header)
+    header_wb = UpdateBillNumberAndTotalProfit(header_wb, bill_numbers, total)
+    header_ws = header_wb.active
+
+    widths = GetColumnWidthTracker(header_ws)
+    for row_values, _ in IterMainDataRows(express_data, stock_data):
+        for col, value in row_values.items():
+            TrackColumnWidth(widths, col, value)
+    AdjustExcelColWidthAndAddBorder(header_wb)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(header_ws.title)
+
+    for letter, dimension in header_ws.column_dimensions.items():
+        ws.column_dimensions[letter].width = dimension.width
+    ws.freeze_panes = header_ws.freeze_panes
+    for merged in header_ws.merged_cells.ranges:
+        ws.merged_cells.add(merged.coord)
+
+    for row in header_ws.iter_rows(min_row=1, max_row=5, max_col=REPORT_LAST_COLUMN):
+        ws.append([CopyToWriteOnlyCell(ws, cell) for cell in row])
+
+    # One reusable cell per column and style, the writer serializes a cell
+    # as soon as its row is appended
+    cells = {}
+    for name in ("body", "body_error", "body_empty"):
+        style = RegisterStyle(wb, name)
+        for col in range(1, REPORT_LAST_COLUMN + 1):
+            cell = WriteOnlyCell(ws)
+            ApplyStyle(cell, style)
+            cells[col, name] = cell
+
+    for row_values, row_styles in IterMainDataRows(express_data, stock_data):
+        row = []
+        for col, style in row_styles.items():
+            cell = cells[col, style]
+            cell.value = row_values.get(col)
+            row.append(cell)
+        ws.append(row)
+
+    wb.save(output)
+
+def CopyToWriteOnlyCell(ws, cell):
+    """
+    Value and style of a regular cell as a WriteOnlyCell of ws, None for an
+    empty unstyled cell (merged cells included).
+    """
+    if cell.value is None and not cell.has_style:
+        return None
+
+    copied = WriteOnlyCell(ws, cell.value)
+    if cell.has_style:
+        copied.font = copy(cell.font)
+        copied.fill = copy(cell.fill)
+        copied.border = copy(cell.border)
+        copied.alignment = copy(cell.alignment)
+        copied.number_format = cell.number_format
+        copied.protection = copy(cell.protection)
+    return copied
+
+def WriteThaiNameHeader(wb, header):
+    """
+    The form fields of the ร้านย่อย report (REPORT_HEADER_CELLS).
+    """
+    wb = WriteTitle(wb, header["title"])
+    wb = WriteDateTime(wb, header["date"], header["time"])
+    return WriteBranchNumberAndVersion(wb, header["branch_number"], header["version"])
+
+def BuildTemplateReport(wb, customer, start_date, end_date, express_data, bill_numbers, total, stock_data):
+    """
+    Fill a GBH/DH/HP template workbook (see LoadTemplate) from already
+    parsed inputs.
+    """
+    wb = WriteTemplateHeader(wb, customer, start_date, end_date, bill_numbers, total)
+    return GetTemplateWriters(customer)[1](wb, express_data, stock_data)
+
+def BuildTemplateBody(customer, option, express_data, stock_data):
+    """
+    GBH/DH/HP template with the data rows written and the header
+    placeholders ('?') still in place.
+    """
+    with Stage("LoadTemplate"):
+        wb = LoadTemplate(customer, option)
+
+    with Stage(f"Write{customer}FileMainData", rows_in=len(express_data)) as stage:
+        wb = GetTemplateWriters(customer)[1](wb, express_data, stock_data)
+        # One data row per barcode, the header rows are not counted
+        stage["rows_out"] = len(express_data)
+
+    return wb
+
+def WriteTemplateHeader(wb, customer, start_date, end_date, bill_numbers, total):
+    """
+    The date range, bill and total fields of a GBH/DH/HP template
+    (REPORT_HEADER_CELLS).
+    """
+    return GetTemplateWriters(customer)[0](wb, start_date, end_date, bill_numbers, total)
+
+def GetTemplateWriters(customer):
+    """
+    Returns:
+        tuple: (write_information, write_main_data) of the customer.
+    """
+    return {
+        "GBH": (WriteGBHFileInformation, WriteGBHFileMainData),
+        "DH": (WriteDHFileInformation, WriteDHFileMainData),
+        "HP": (WriteHPFileInformation, WriteHPFileMainData),
+    }[customer]
 
 # endregion
 
@@ -142,12 +452,7 @@ def GenerateExcel():
 
     # Row 2
     ws["A2"] = "บิล:"
-    ws["A2"].font = Font(size=13, bold=True, color="9933FF")
-    ws["A2"].fill = PatternFill(
-        fill_type="solid",
-        start_color="E2EFDA",
-        end_color="E2EFDA",
-    )
+    ApplyStyle(ws["A2"], RegisterStyle(wb, "bill_label"))
 
     ws.merge_cells("B2:D2")
     ws["B2"] = "Row 2: A-D merged"
@@ -181,44 +486,32 @@ def GenerateExcel():
     ws["F5"] = "แพ็ค"
     ws["G5"] = "จัดสินค้า"
 
+    column_header = RegisterStyle(wb, "column_header")
     for row in ws["A5:G5"]:
         for cell in row:
-            cell.alignment = CENTER
-            cell.font = Font(size=12, bold=True)
+            ApplyStyle(cell, column_header)
 
     ws.freeze_panes = "A6"
 
     return wb
 
-def UpdateUserInputTitle(wb):
-    """
-    Shows a text box. Whatever the user types is stored automatically
-    (no save button) and returned exactly as entered.
-    """
-
+def WriteTitle(wb, title):
     ws = wb.active
 
-    # Always store the latest raw text
-    ws["A1"].value = GetUserInputTitle()
-    ws["A1"].font = Font(size=32, color="6600CC")
-    ws["A1"].fill = PatternFill(
-        fill_type="solid",
-        start_color="FFAAFF",
-        end_color="FFAAFF",
-    )
+    ws["A1"].value = title
+    ApplyStyle(ws["A1"], RegisterStyle(wb, "title"))
 
     return wb
 
-def GetDateTime(wb):
+def GetDateTime():
     """
     Show date & time inputs for the Excel file.
     - Defaults to current date & time on first run
     - User can edit any part they want
     - Values are stored live in st.session_state["date"] and ["time"]
-    - No need to return anything; you can read from session_state later.
+    - Returns them as (date, time) for WriteDateTime
     """
     st.subheader("Date & Time")
-    ws = wb.active
 
     now = datetime.now(ZoneInfo("Asia/Bangkok"))
 
@@ -234,31 +527,28 @@ def GetDateTime(wb):
     st.session_state["date"] = date_val.strftime("%d/%m/") + str(date_val.year + 543)
     st.session_state["time"] = time_val.strftime("%H:%M")
 
-    ws["E2"] = st.session_state["time"]
-    ws["E2"].font = Font(size=14, color="000000")
-    ws["E2"].fill = PatternFill(
-        fill_type="solid",
-        start_color="FFC000",
-        end_color="FFC000",
-    )
+    return st.session_state["date"], st.session_state["time"]
 
-    ws["F2"] = "วันที่   " + st.session_state["date"]
-    ws["F2"].font = Font(size=16, color="FF0000")
-    ws["F2"].fill = PatternFill(
-        fill_type="solid",
-        start_color="FCE4D6",
-        end_color="FCE4D6",
-    )
+def WriteDateTime(wb, date_text, time_text):
+    """
+    date_text is the Buddhist era date (dd/mm/yyyy), time_text is HH:MM.
+    """
+    ws = wb.active
+
+    ws["E2"] = time_text
+    ApplyStyle(ws["E2"], RegisterStyle(wb, "time"))
+
+    ws["F2"] = "วันที่   " + date_text
+    ApplyStyle(ws["F2"], RegisterStyle(wb, "date"))
 
     return wb
 
-def GetBranchNumberAndVersion(wb):
+def GetBranchNumberAndVersion():
     """
     Get the branch number and the version of the file 
-    from user input and put in the excel
+    from user input, for WriteBranchNumberAndVersion
     """
     st.subheader("Branch Number & Version")
-    ws = wb.active
 
     st.text_input(
         "Enter the branch number:",
@@ -272,22 +562,16 @@ def GetBranchNumberAndVersion(wb):
         placeholder="Enter the version number here",
     )
 
-    ws["A3"] = "เขต:  " + st.session_state["branch_number"]
-    ws["A3"].font = Font(size=18, color="CC00FF")
-    ws["A3"].fill = PatternFill(
-        fill_type="solid",
-        start_color="FFCCFF",
-        end_color="FFCCFF",
-    )
+    return st.session_state["branch_number"], st.session_state["version"]
 
-    ws["F3"] = st.session_state["version"]
-    ws["F3"].font = Font(size=21, bold=True, color="0000FF")
-    ws["F3"].fill = PatternFill(
-        fill_type="solid",
-        start_color="97DCFF",
-        end_color="97DCFF",
-    )
-    #97DCFF
+def WriteBranchNumberAndVersion(wb, branch_number, version):
+    ws = wb.active
+
+    ws["A3"] = "เขต:  " + branch_number
+    ApplyStyle(ws["A3"], RegisterStyle(wb, "branch"))
+
+    ws["F3"] = version
+    ApplyStyle(ws["F3"], RegisterStyle(wb, "version"))
 
     return wb
 
@@ -296,120 +580,101 @@ def UpdateBillNumberAndTotalProfit(wb, bill_numbers, total):
 
     bill_number_range = FindBillNumberRange(bill_numbers)
     ws["B2"] = bill_number_range
-    ws["B2"].font = Font(size=20, color="0000FF")
-    ws["B2"].fill = PatternFill(
-        fill_type="solid",
-        start_color="E2EFDA",
-        end_color="E2EFDA",
-    )
+    ApplyStyle(ws["B2"], RegisterStyle(wb, "bill_range"))
 
     ws["A4"] = "รวม                                         " + total + "   บาท"
-    ws["A4"].font = Font(size=16, color="0066FF")
-    ws["A4"].fill = PatternFill(
-        fill_type="solid",
-        start_color="CCCCFF",
-        end_color="CCCCFF",
-    )
+    ApplyStyle(ws["A4"], RegisterStyle(wb, "total"))
 
     ws["E4"] = "จำนวนบิล         " + str(len(bill_numbers)) + "    บิล"
-    ws["E4"].font = Font(size=14, color="FF0066")
-    ws["E4"].fill = PatternFill(
-        fill_type="solid",
-        start_color="E2EFDA",
-        end_color="E2EFDA",
-    )
+    ApplyStyle(ws["E4"], RegisterStyle(wb, "bill_count"))
 
     return wb
 
 def WriteMainData(wb, express_data, stock_data):
+    """
+    Write one bordered row per barcode below the header and record the
+    column widths on the way, for AdjustExcelColWidthAndAddBorder.
+    """
     ws = wb.active
+    widths = GetColumnWidthTracker(ws)
+    styles = {name: RegisterStyle(wb, name) for name in ("body", "body_error", "body_empty")}
 
+    for excel_row, (row_values, row_styles) in enumerate(IterMainDataRows(express_data, stock_data), start=6):
+        for col, style in row_styles.items():
+            value = row_values.get(col)
+            ApplyStyle(ws.cell(row=excel_row, column=col, value=value), styles[style])
+            TrackColumnWidth(widths, col, value)
+
+    return wb
+
+def IterMainDataRows(express_data, stock_data):
+    """
+    Values and CELL_STYLES names of the ร้านย่อย data rows, in order.
+
+    Yields:
+        tuple: ({column: value}, {column: style name}) for columns A to G
+    """
     stock_lookup = {
         SafeInt(row[0]): row[1:]
         for row in stock_data
         if SafeInt(row[0]) is not None
     }
 
-    for idx, item in enumerate(express_data, start=1):
-        excel_row = idx + 5
-
-        cell = ws[f"A{excel_row}"]
-        cell.value = idx
-        cell.alignment = CENTER
-        cell.font = Font(size=12)
+    body = "body"
+    body_error = "body_error"
+    body_empty = "body_empty"
 
-        ws[f"D{excel_row}"].value = item["sum_qty"]
-        ws[f"D{excel_row}"].alignment = CENTER
-        ws[f"D{excel_row}"].font = Font(size=12)
+    for idx, (barcode, sum_qty) in enumerate(zip(express_data["barcode"], express_data["sum_qty"]), start=1):
+        row_styles = {col: body_empty for col in range(1, REPORT_LAST_COLUMN + 1)}
+        row_values = {1: idx, 4: sum_qty}
 
-        if "_" in item["barcode"]:
-            before, _, after = item["barcode"].partition("_")
-            ws[f"B{excel_row}"].value = before
-            ws[f"B{excel_row}"].alignment = CENTER
-            ws[f"B{excel_row}"].font = Font(size=12)
-            ws[f"B{excel_row}"].fill = ERROR_HIGHLIGHT
+        row_styles[1] = body
+        row_styles[4] = body
 
-            ws[f"C{excel_row}"] = after
-            ws[f"C{excel_row}"].alignment = CENTER
-            ws[f"C{excel_row}"].font = Font(size=12)
-            continue
+        if "_" in barcode:
+            before, _, after = barcode.partition("_")
+            row_values[2] = before
+            row_styles[2] = body_error
 
-        ws[f"B{excel_row}"].value = item["barcode"]
-        ws[f"B{excel_row}"].alignment = CENTER
-        ws[f"B{excel_row}"].font = Font(size=12)
+            row_values[3] = after
+            row_styles[3] = body
+        else:
+            row_values[2] = barcode
+            row_styles[2] = body
 
-        barcode = SafeInt(item.get("barcode"))
-        stock_item = stock_lookup.pop(barcode, None)
+            stock_item = stock_lookup.pop(SafeInt(barcode), None)
 
-        if stock_item is not None:
-            ws[f"C{excel_row}"].value = stock_item[0]
-            ws[f"C{excel_row}"].alignment = CENTER
-            ws[f"C{excel_row}"].font = Font(size=12)
+            if stock_item is not None:
+                row_values[3] = stock_item[0]
+                row_styles[3] = body
 
-            ws[f"E{excel_row}"].value = stock_item[1]
-            ws[f"E{excel_row}"].alignment = CENTER
-            ws[f"E{excel_row}"].font = Font(size=12)
-        else:
-            ws[f"C{excel_row}"].value = (
-                "Cannot find the barcode.\nUpdate the main sheet of the stock file."
-            )
-            ws[f"C{excel_row}"].alignment = CENTER
-            ws[f"C{excel_row}"].font = Font(size=12)
-            ws[f"C{excel_row}"].fill = ERROR_HIGHLIGHT
+                row_values[5] = stock_item[1]
+                row_styles[5] = body
+            else:
+                row_values[3] = (
+                    "Cannot find the barcode.\nUpdate the main sheet of the stock file."
+                )
+                row_styles[3] = body_error
 
-    return wb
+        yield row_values, row_styles
 
 def AdjustExcelColWidthAndAddBorder(wb):
+    """
+    Border the header row and size every column from the widths the
+    writers recorded, padded and capped so it doesn't get crazy wide.
+    """
     ws = wb.active
+    widths = GetColumnWidthTracker(ws)
 
-    # Choose the row and column want to autosize
-    min_col = 1
-    max_col = ws.max_column
-    min_row = 5
-    max_row = ws.max_row
-
-    for col in range(min_col, max_col + 1):
-        col_letter = get_column_letter(col)
-        max_len = 0
-
-        for row in range(min_row, max_row + 1):
-            value = ws.cell(row=row, column=col).value
-            ws.cell(row=row, column=col).border = BORDER
-            if value is None:
-                continue
-
-            # Convert to string for measuring
-            text = str(value)
+    header_row = 5
+    for col in range(1, REPORT_LAST_COLUMN + 1):
+        cell = ws.cell(row=header_row, column=col)
+        cell.border = BORDER
+        TrackColumnWidth(widths, col, cell.value)
 
-            # Optional: ignore very long multi-line values
-            text = text.split("\n")[0]
-
-            if len(text) > max_len:
-                max_len = len(text)
-
-        # Add padding, and cap width so it doesn't get crazy wide
+    for col in range(1, REPORT_LAST_COLUMN + 1):
         padding = 6 if col != 1 else 3
-        ws.column_dimensions[col_letter].width = min(max_len + padding, 60)
+        ws.column_dimensions[get_column_letter(col)].width = min(widths.get(col, 0) + padding, 60)
 
     return wb
 
@@ -417,18 +682,11 @@ def AdjustExcelColWidthAndAddBorder(wb):
 
 # region --- Excel generation helper functions for other companies ---
 
-def GetTemplate(file_choice):
-    templates = {
-        "GBH": {"path": "template file/GBH.xlsx", "sheets": ["AS", "GL"]},
-        "DH": {"path": "template file/DH.xlsx", "sheets": ["GL", "MR"]},
-        "HP": {"path": "template file/HP.xlsx", "sheets": ["HP"]}
-    }
-
-    if file_choice not in templates:
+def GetTemplateSheet(file_choice):
+    if file_choice not in TEMPLATES:
         return None
 
-    template = templates[file_choice]
-    wb = load_workbook(template["path"])
+    template = TEMPLATES[file_choice]
 
     if len(template["sheets"]) == 1:
         sheet_choice = template["sheets"][0]
@@ -445,24 +703,22 @@ def GetTemplate(file_choice):
 
     if not sheet_choice:
             return None
-        
-    for ws in wb.worksheets[:]:
-            if ws.title != sheet_choice:
-                wb.remove(ws)
 
-    wb.active = 0
-    return wb, sheet_choice
+    return sheet_choice
 
 def WriteGBHFileInformation(wb, start_date, end_date, bill_number, total):
     ws = wb.active
+    placeholders = GetTemplatePlan(ws)["placeholders"]
 
     ws["F2"].value = start_date
     ws["G2"].value = end_date
 
     bill_number_range = FindBillNumberRange(bill_number)
     information = [bill_number_range, str(len(bill_number)), str(total)]
+    text = placeholders["A3"]
     for replacement in information:
-        ws["A3"].value = ws["A3"].value.replace("?", replacement, 1)
+        text = text.replace("?", replacement, 1)
+    ws["A3"].value = text
 
     return wb
 
@@ -471,16 +727,17 @@ def WriteGBHFileMainData(wb, express_data, stock_data):
 
 def WriteDHFileInformation(wb, start_date, end_date, bill_number, total):
     ws = wb.active
+    placeholders = GetTemplatePlan(ws)["placeholders"]
 
-    ws["I1"].value = ws["I1"].value.replace("?", start_date.replace(".", "/"))
+    ws["I1"].value = placeholders["I1"].replace("?", start_date.replace(".", "/"))
     ws["A2"].value = start_date
     ws["E2"].value = end_date
 
-    ws["A3"].value = ws["A3"].value.replace("?", str(total))
-    ws["E3"].value = ws["E3"].value.replace("?", str(len(bill_number)))
+    ws["A3"].value = placeholders["A3"].replace("?", str(total))
+    ws["E3"].value = placeholders["E3"].replace("?", str(len(bill_number)))
 
     bill_number_range = FindBillNumberRange(bill_number)
-    ws["A4"].value = ws["A4"].value.replace("?", bill_number_range)
+    ws["A4"].value = placeholders["A4"].replace("?", bill_number_range)
 
     return wb
 
@@ -489,14 +746,17 @@ def WriteDHFileMainData(wb, express_data, stock_data):
 
 def WriteHPFileInformation(wb, start_date, end_date, bill_number, total):
     ws = wb.active
+    placeholders = GetTemplatePlan(ws)["placeholders"]
 
     information = [start_date, end_date, str(total)]
+    text = placeholders["A1"]
     for replacement in information:
-        ws["A1"].value = ws["A1"].value.replace("?", replacement, 1)
+        text = text.replace("?", replacement, 1)
+    ws["A1"].value = text
 
     bill_number_range = FindBillNumberRange(bill_number)
     ws["A2"].value = (
-        ws["A2"].value
+        placeholders["A2"]
         .replace("?", bill_number_range, 1)
         .replace("?", str(len(bill_number)), 1)
     )
@@ -509,13 +769,11 @@ def WriteHPFileMainData(wb, express_data, stock_data):
 def WriteExcelMainData(wb, express_data, stock_data):
     ws = wb.active
 
-    header_end_row = GetLastRealRow(ws)
-    stock_col =  8 if any(
-        isinstance(ws.cell(row=header_end_row, column=col).value, str)
-        and "stock" in ws.cell(row=header_end_row, column=col).value.lower()
-        for col in range(1, ws.max_column + 1)
-    ) else 7
-    
+    plan = GetTemplatePlan(ws)
+    extent = GetSheetExtent(ws)
+    header_end_row = plan["header_end_row"]
+    stock_col = plan["stock_col"]
+
     stock_lookup = {}
     for s in stock_data:
         barcode = SafeInt(s[0])
@@ -529,10 +787,12 @@ def WriteExcelMainData(wb, express_data, stock_data):
             s[-1],
         )
 
-    column_styles = CaptureColumnStyles(ws, header_end_row+1)
+    column_styles = plan["column_styles"]
+    detail_scale = plan["detail_scale"]
+    detail_width = 0
     sum = 0.0
 
-    for idx, item in enumerate(express_data, start = 1):
+    for idx, (barcode, sum_qty) in enumerate(zip(express_data["barcode"], express_data["sum_qty"]), start = 1):
         write_row = header_end_row + idx
 
         index_cell = ws.cell(row=write_row, column = 1)
@@ -546,13 +806,14 @@ def WriteExcelMainData(wb, express_data, stock_data):
             ApplyColumnStyleToCell(ws.cell(write_row, col), style)
 
         index_cell.value = idx
-        amount_cell.value = item["sum_qty"]
-        sum += item["sum_qty"]
+        amount_cell.value = sum_qty
+        sum += sum_qty
 
-        barcode = item.get("barcode", "")
         if "_" in barcode:
             barcode_cell.value, detail_cell.value = barcode.split("_", 1)
             barcode_cell.fill = ERROR_HIGHLIGHT
+            detail_width = max(detail_width, EstimateTextWidth(detail_cell.value, detail_scale))
+            ExtendSheetExtent(ws, write_row, 5)
             continue
 
         barcode_cell.value = barcode
@@ -569,76 +830,235 @@ def WriteExcelMainData(wb, express_data, stock_data):
             detail_cell.value = "Cannot find the barcode.\nUpdate the main sheet."
             detail_cell.fill = ERROR_HIGHLIGHT
 
-    cell = ws[f"E{GetLastRealRow(ws)+1}"]
+        ExtendSheetExtent(ws, write_row, stock_col if stock_cell.value is not None else 5)
+
+        detail_width = max(detail_width, EstimateTextWidth(detail_cell.value, detail_scale))
+
+    last_row = extent["row"]
+    cell = ws[f"E{last_row+1}"]
     cell.value = sum
-    cell.font = copy(ws[f"E{GetLastRealRow(ws)}"].font) + Font(bold=True)
+    cell.font = copy(ws[f"E{last_row}"].font) + Font(bold=True)
     cell.fill = PatternFill(
         fill_type="solid",
         start_color="FFFF00",
         end_color="FFFF00",
     )
 
-    AutoResizeColumn(ws, 3, end_row=GetLastRealRow(ws)-1, padding=0, max_width=90)
+    # Data rows were measured while writing, the header when the plan was compiled
+    detail_width = max(detail_width, plan["header_detail_width"])
+    ws.column_dimensions["C"].width = max(8, min(detail_width, 90))
 
     return wb
 
-def CaptureColumnStyles(ws, style_row):
+def CaptureColumnStyles(ws, style_row, max_column=None):
+    """
+    Capture the style of every column of style_row once, as StyleArrays
+    (shared style ids) with the report BORDER already swapped in, ready
+    to be stamped on new rows by ApplyColumnStyleToCell.
+    """
     styles = {}
-    max_column = GetLastRealCol(ws)
+    border_id = ws.parent._borders.add(BORDER)
+    if max_column is None:
+        max_column = GetSheetExtent(ws)["col"]
     for col in range(1, max_column + 1):
-        cell = ws.cell(row=style_row, column=col)
-        styles[col] = {
-            "font": copy(cell.font),
-            "border": copy(cell.border),
-            "fill": copy(cell.fill),
-            "number_format": cell.number_format,
-            "alignment": copy(cell.alignment),
-            "protection": copy(cell.protection),
-        }
+        style = copy(ws.cell(row=style_row, column=col)._style)
+        style.borderId = border_id
+        styles[col] = style
     return styles
 
 def ApplyColumnStyleToCell(cell, style):
-    cell.font = copy(style["font"])
-    cell.border = copy(style["border"])
-    cell.fill = copy(style["fill"])
-    cell.number_format = style["number_format"]
-    cell.alignment = copy(style["alignment"])
-    cell.protection = copy(style["protection"])
-    cell.border = BORDER
-
-def AutoResizeColumn(ws, col, start_row=1, end_row=None, 
-                     padding=2, min_width=8, max_width=50):
-    if end_row is None:
-        end_row = ws.max_row
-
-    max_width_est = 0
-    merged_ranges = ws.merged_cells.ranges
-    col_letter = get_column_letter(col)
-
-    for row in range(start_row, end_row + 1):
-        coord = f"{col_letter}{row}"
-
-        skip = False
-        for merged in merged_ranges:
-            if coord in merged and not (row == merged.min_row and col == merged.min_col):
-                skip = True
-                break
-        if skip:
-            continue
+    """
+    Give the cell the captured font, border, fill, number format, alignment
+    and protection ids, keeping its own named style link and flags.
+    """
+    current = cell._style
+    cell._style = copy(style)
 
-        cell = ws.cell(row=row, column=col)
-        if not cell.value:
-            continue
+    if current is None:
+        # Fresh cell, openpyxl defaults to no named style and no flags
+        cell._style.xfId = cell._style.pivotButton = cell._style.quotePrefix = 0
+    else:
+        cell._style.xfId = current.xfId
+        cell._style.pivotButton = current.pivotButton
+        cell._style.quotePrefix = current.quotePrefix
 
-        text = str(cell.value)
-        font_size = cell.font.sz or 11
-        scale = font_size / 11
+def EstimateTextWidth(value, scale):
+    """
+    Column width needed for value in a font scale times the default size.
+    """
+    if not value:
+        return 0
+    return int(len(str(value)) * scale)
 
-        est = int(len(text) * scale) + padding
-        max_width_est = max(max_width_est, est)
+#endregion
 
-    final_width = max(min_width, min(max_width_est, max_width))
-    ws.column_dimensions[col_letter].width = final_width
+# region --- Template pool ---
+
+@st.cache_resource
+def GetTemplatePool():
+    """
+    Parsed template prototypes, one single-sheet workbook per
+    (path, sheet), shared by every rerun of the script.
+    """
+    return {"prototypes": {}, "lock": Lock()}
+
+def GetTemplatePrototype(path, sheet):
+    """
+    Return the shared prototype of one template sheet, parsing the file
+    again only when its mtime changed. Never write to the prototype,
+    use LoadTemplate to get a copy.
+    """
+    pool = GetTemplatePool()
+    mtime = os.path.getmtime(path)
+
+    with pool["lock"]:
+        entry = pool["prototypes"].get((path, sheet))
+
+        if entry is None or entry[0] != mtime:
+            wb = load_workbook(path)
+
+            for ws in wb.worksheets[:]:
+                if ws.title != sheet:
+                    wb.remove(ws)
+
+            wb.active = 0
+            # Compiled before the first clone: it interns the report border
+            # in the prototype's style table, so every clone inherits it
+            entry = (mtime, wb, CompileTemplatePlan(wb.active))
+            pool["prototypes"][(path, sheet)] = entry
+
+    return entry[1], entry[2]
+
+def LoadTemplate(file_choice, sheet_choice):
+    """
+    Isolated, ready to fill copy of one sheet of a customer template,
+    with its layout plan attached (see GetTemplatePlan).
+    """
+    path = TEMPLATES[file_choice]["path"]
+    prototype, plan = GetTemplatePrototype(path, sheet_choice)
+
+    wb = CloneWorkbook(prototype)
+    AttachTemplatePlan(wb.active, plan)
+    return wb
+
+def CompileTemplatePlan(ws):
+    """
+    Everything WriteExcelMainData and the Write*FileInformation functions
+    would otherwise rediscover on each run, read from an untouched template
+    sheet. Shared by every copy of the template, treat it as read-only.
+
+    Returns:
+        dict: header_end_row, header_last_col (the sheet extent before any
+        data row), stock_col, column_styles (StyleArrays of the first data
+        row with the report border, see CaptureColumnStyles), detail_scale,
+        header_detail_width (widest header text of column C), placeholders
+        ({coordinate: template text} of the header cells holding '?'),
+        merged (bounds and GetMergedCellIndex of the merged ranges).
+    """
+    header_end_row = GetLastRealRow(ws)
+    header_last_col = GetLastRealCol(ws, header_end_row)
+
+    header = [ws.cell(row=header_end_row, column=col).value for col in range(1, header_last_col + 1)]
+    stock_col = 8 if any(isinstance(value, str) and "stock" in value.lower() for value in header) else 7
+
+    column_styles = CaptureColumnStyles(ws, header_end_row + 1, header_last_col)
+
+    merged_index = GetMergedCellIndex(ws)
+
+    header_detail_width = 0
+    for row in range(1, header_end_row + 1):
+        cell = ws.cell(row=row, column=3)
+        if cell.value and not IsHiddenByMerge(merged_index, row, 3):
+            header_detail_width = max(header_detail_width, EstimateTextWidth(cell.value, (cell.font.sz or 11) / 11))
+
+    # Existing cells only, iter_rows would create the missing ones
+    placeholders = {
+        cell.coordinate: cell.value
+        for (row, _), cell in ws._cells.items()
+        if row <= header_end_row and isinstance(cell.value, str) and "?" in cell.value
+    }
+
+    return {
+        "header_end_row": header_end_row,
+        "header_last_col": header_last_col,
+        "stock_col": stock_col,
+        "column_styles": column_styles,
+        "detail_scale": (ws.parent._fonts[column_styles[3].fontId].sz or 11) / 11 if 3 in column_styles else 1,
+        "header_detail_width": header_detail_width,
+        "placeholders": placeholders,
+        "merged": MERGED_CELL_INDEXES[ws],
+    }
+
+def AttachTemplatePlan(ws, plan):
+    """
+    Make a fresh copy of a template sheet run from plan: its extent and
+    merged index are seeded instead of scanned.
+    """
+    TEMPLATE_PLANS[ws] = plan
+    SHEET_EXTENTS[ws] = {"row": plan["header_end_row"], "col": plan["header_last_col"]}
+    MERGED_CELL_INDEXES[ws] = plan["merged"]
+
+def GetTemplatePlan(ws):
+    """
+    Layout plan of a template sheet, compiled on the spot for a sheet that
+    did not come from LoadTemplate. Must be called before anything is
+    written below the header.
+    """
+    plan = TEMPLATE_PLANS.get(ws)
+    if plan is None:
+        plan = CompileTemplatePlan(ws)
+        AttachTemplatePlan(ws, plan)
+    return plan
+
+def CloneWorkbook(wb):
+    """
+    Deep copy of a workbook that is cheaper than parsing it again.
+
+    deepcopy alone empties openpyxl's IndexedList style tables and is
+    slow on cells, so the style tables and the cells are copied by hand
+    and deepcopy handles the rest of the object tree.
+    """
+    memo = {}
+
+    for value in vars(wb).values():
+        if isinstance(value, IndexedList):
+            memo[id(value)] = CopyIndexedList(value, memo)
+
+    for ws in wb.worksheets:
+        memo[id(ws._cells)] = {}
+
+    clone = deepcopy(wb, memo)
+
+    for ws, ws_clone in zip(wb.worksheets, clone.worksheets):
+        CopyCells(ws, ws_clone)
+
+    return clone
+
+def CopyIndexedList(indexed, memo):
+    clone = IndexedList()
+    list.extend(clone, deepcopy(list(indexed), memo))
+    clone._dict = deepcopy(indexed._dict, memo)
+    clone.clean = indexed.clean
+    return clone
+
+def CopyCells(source, target):
+    cells = target._cells
+
+    for (row, col), cell in source._cells.items():
+        if isinstance(cell, MergedCell):
+            new_cell = MergedCell(target, row=row, column=col)
+        else:
+            new_cell = Cell(target, row=row, column=col)
+            new_cell._value = cell._value
+            new_cell.data_type = cell.data_type
+
+            if cell._hyperlink is not None:
+                new_cell._hyperlink = copy(cell._hyperlink)
+            if cell._comment is not None:
+                new_cell.comment = copy(cell._comment)
+
+        new_cell._style = copy(cell._style)
+        cells[row, col] = new_cell
 
 #endregion
 
@@ -651,7 +1071,17 @@ def GetExpressData(uploaded_file):
     and return all rows of data below that line.
 
     Returns:
-        list[list]: list of rows; each row is a list of cell values.
+        tuple: (data, bill_numbers, total) as produced by TreatExpressData.
+    """
+    return TreatExpressData(IterExpressRows(uploaded_file))
+
+def IterExpressRows(uploaded_file):
+    """
+    Stream the Express report in read-only mode and yield the split rows
+    found below the SECOND separator line, one row at a time.
+
+    Only the current row is held in memory, so the cost stays flat no
+    matter how long the report is.
     """
     # Make sure we're at the start of the file
     try:
@@ -660,106 +1090,104 @@ def GetExpressData(uploaded_file):
         # Some file-like objects may not have seek; ignore if so
         pass
 
-    wb = load_workbook(uploaded_file, data_only=True)
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
     ws = wb.active  # or wb["SheetName"] if you want a specific sheet
 
-    max_row = ws.max_row
-    max_col = ws.max_column
-
-    separator_rows = []
-
-    for r in range(1, max_row + 1):
-        row_has_dash_line = False
+    try:
+        separators_found = 0
 
-        for c in range(1, max_col + 1):
-            cell_value = ws.cell(row=r, column=c).value
+        for row_values in ws.iter_rows(values_only=True):
+            if separators_found < 2:
+                if IsSeparatorRow(row_values):
+                    separators_found += 1
+                continue
 
-            if isinstance(cell_value, str):
-                stripped = cell_value.strip()
-                # check "purely horizontal line", e.g. "-----" or " -------- "
-                if stripped and set(stripped) == {"-"}:
-                    row_has_dash_line = True
-                    break  # we already know this row is a separator
+            # Optionally skip completely empty rows or integer row
+            if all(v in (None, "") for v in row_values) \
+                or all(type(v) in (int, float) for v in row_values):
+                    continue
 
-        if row_has_dash_line:
-            separator_rows.append(r)
+            yield row_values[0].split()
+    finally:
+        wb.close()
 
     # Need at least 2 separator rows
-    if len(separator_rows) < 2:
+    if separators_found < 2:
         raise ValueError("Invalid Express File Format: missing seperators (second horizontal line)")
 
-    second_sep_row = separator_rows[1]
-    start_row = second_sep_row + 1
-
-    data = []
-    for r in range(start_row, max_row + 1):
-        row_values = [
-            ws.cell(row=r, column=c).value
-            for c in range(1, max_col + 1)
-        ]
-
-        # Optionally skip completely empty rows or integer row
-        if all(v in (None, "") for v in row_values) \
-            or all(type(v) in (int, float) for v in row_values):
-                continue
+def IsSeparatorRow(row_values):
+    for cell_value in row_values:
+        if isinstance(cell_value, str):
+            stripped = cell_value.strip()
+            # check "purely horizontal line", e.g. "-----" or " -------- "
+            if stripped and set(stripped) == {"-"}:
+                return True
+    return False
 
-        split_row = row_values[0].split()
-        data.append(split_row)
+def TreatExpressData(data):
+    """
+    Clean the split Express rows in a single pass.
 
-    return TreatExpressData(data)
+    Repairs the barcode column, drops page headers and short garbage rows,
+    collects the bill numbers (the first row of every bill is its header and
+    is dropped) and stops at the "รวมทั้งสิ้น" line, whose third last field
+    is the total. `data` can be any iterable, rows after the total are never
+    read.
 
-def TreatExpressData(data):
+    Returns:
+        tuple: (data, bill_number_collection, total)
+    """
     bill_number = ""
     bill_number_collection = []
-    index = 0
+    treated = []
 
     for row in data:
-        if len(row) < 3:
-            continue
+        RepairExpressBarcode(row)
 
-        third = str(row[2]).strip()
+        if row[0] == "รวมทั้งสิ้น":
+            total = (row[-3])
+            return treated, bill_number_collection, total
 
-        # already good
-        if third.isdigit():
+        if len(row) < 5 or has_thai(row[0]):
             continue
 
-        # try to repair "1234.SOMETHING" => ["1234", "SOMETHING"]
-        if "." in third:
-            left, _, right = third.partition(".")
-
-            # only split if left is digits AND right looks like a real next-field (not just decimals)
-            if left.isdigit() and right and not right.isdigit():
-                row[2] = left
-                row.insert(3, right)  # shift the rest to the right
-                continue
-
-        if not third.isdigit():
-            row[2] = "0000000000000_"+ third
-            row.insert(3, third)
-
-    while (index < len(data) and data[index][0] != "รวมทั้งสิ้น"):
-        if len(data[index]) < 5 or has_thai(data[index][0]):
-            del data[index]
-            continue
-        
-        checking_bill = data[index][0]
-        checking_bill = re.sub(r'[^A-Za-z0-9]', '', checking_bill)
+        checking_bill = NON_ALPHANUMERIC.sub('', row[0])
 
         if (checking_bill != bill_number):
             bill_number = checking_bill
             bill_number_collection.append(bill_number)
-            del data[index]
-            index -= 1
-    
-        index += 1
+            continue
 
-    if (data[index][0] == "รวมทั้งสิ้น"):
-            total = (data[index][-3])
-            data = data[0 : index]
-            return data, bill_number_collection, total  
+        treated.append(row)
 
     raise ValueError("Cannot find รวมทั้งสิ้น, check the input file.")
 
+def RepairExpressBarcode(row):
+    """
+    Make sure row[2] is a barcode made of digits, editing the row in place.
+    """
+    if len(row) < 3:
+        return
+
+    third = str(row[2]).strip()
+
+    # already good
+    if third.isdigit():
+        return
+
+    # try to repair "1234.SOMETHING" => ["1234", "SOMETHING"]
+    if "." in third:
+        left, _, right = third.partition(".")
+
+        # only split if left is digits AND right looks like a real next-field (not just decimals)
+        if left.isdigit() and right and not right.isdigit():
+            row[2] = left
+            row.insert(3, right)  # shift the rest to the right
+            return
+
+    row[2] = "0000000000000_"+ third
+    row.insert(3, third)
+
 def FindBillNumberRange(bill_number):
     """
     Convert a list of alphanumeric bill numbers into compact string ranges.
@@ -808,52 +1236,64 @@ def FindBillNumberRange(bill_number):
 
 def ExtractPackQtyFromRow(row):
     """
-    Find all cells in the row that contain '.แพ็ค' and
-    sum the numbers before '.แพ็ค'.
+    Find all cells in the row that contain a unit suffix such as '.แพ็ค'
+    and sum the numbers before it.
+
+    E.g. '55.แพ็ค' -> 55, '8.ชิ้น' -> 8.
+    Raises ValueError if no cell holds a quantity.
+    """
+    qty, _ = ExtractQtyByUnitFromRow(row)
+    return qty
 
-    E.g. '55.แพ็ค' -> 55, '8.แพ็ค' -> 8.
-    If nothing found or parse fails, returns 0.
+def ExtractQtyByUnitFromRow(row):
+    """
+    Parse the quantity and unit of every cell in the row with one compiled
+    regex search per cell.
+
+    Returns:
+        tuple: (qty, unit_qty) where qty is the row total and unit_qty maps
+        each unit found (e.g. 'แพ็ค') to its quantity.
     """
     qty = 0.0
-    suffixes = (
-        ".แพ็ค", ".ชิ้น", ".อัน", ".ชุด", ".แผ่น",
-        ".กล่อง", ".ถุง", ".ม้วน", ".ลัง", ".แผง", ".คู่",
-        ".เครื่อง", ".ขวด", ".กระป๋อง", ".เส้น", ".ตัว", ".ใบ",
-        ".เมตร", ".ลูก", ".โหล", ".ดวง"
-    )
+    unit_qty = {}
 
     found = False
     for cell in row:
-        if isinstance(cell, str) and any(suffix in cell for suffix in suffixes):
-            # Find the first matching suffix
-            for suffix in suffixes:
-                if suffix in cell:
-                    before = cell.split(suffix)[0].strip()
-                    break
-
-            before = before.replace(",", "")
-            if not before:
-                continue
+        if not isinstance(cell, str):
+            continue
+
+        # Leftmost suffix in the cell; if another suffix came first in the
+        # text, the number would hold Thai characters and float() would fail
+        match = UNIT_SUFFIX_PATTERN.search(cell)
+        if match is None:
+            continue
+
+        before = cell[:match.start()].strip().replace(",", "")
+        if not before:
+            continue
 
-            qty += float(before)
-            found = True
+        value = float(before)
+        qty += value
+        unit = match.group(1)
+        unit_qty[unit] = unit_qty.get(unit, 0.0) + value
+        found = True
 
     if not found:
         raise ValueError("Self Defined Error 10010: No valid suffix found in this row!")  # raise Python exception
 
-    return qty
+    return qty, unit_qty
 
 def SummariseByBarcode(data_rows):
     """
-    Group rows by (barcode, item_code) = (row[2], row[3])
-    and sum all 'X.แพ็ค' quantities for each group.
+    Group rows by barcode = row[2] and sum all 'X.แพ็ค' style
+    quantities for each group, in total and per unit.
 
     Returns:
         list of dicts:
           {
             'barcode': ...,
-            'item_code': ...,
             'sum_qty': ...,
+            'unit_qty': {unit: qty, ...},
           }
     """
     summaries = OrderedDict()  # to keep order of first appearance
@@ -870,13 +1310,31 @@ def SummariseByBarcode(data_rows):
             summaries[barcode] = {
                 "barcode": barcode,
                 "sum_qty": 0.0,
+                "unit_qty": {},
             }
 
-        qty = ExtractPackQtyFromRow(row)
-        summaries[barcode]["sum_qty"] += qty
+        qty, unit_qty = ExtractQtyByUnitFromRow(row)
+        summary = summaries[barcode]
+        summary["sum_qty"] += qty
+        for unit, value in unit_qty.items():
+            summary["unit_qty"][unit] = summary["unit_qty"].get(unit, 0.0) + value
 
     return list(summaries.values())
 
+def SummariseByBarcodeFrame(data_rows):
+    """
+    SummariseByBarcode as a DataFrame, the shape the writers and the stock
+    lookup read: columns barcode, sum_qty and unit_qty, one row per
+    barcode in order of first appearance.
+    """
+    summaries = SummariseByBarcode(data_rows)
+
+    return pd.DataFrame({
+        "barcode": pd.Series([summary["barcode"] for summary in summaries], dtype=object),
+        "sum_qty": np.array([summary["sum_qty"] for summary in summaries], dtype=float),
+        "unit_qty": pd.Series([summary["unit_qty"] for summary in summaries], dtype=object),
+    })
+
 def GetStockData(uploaded_file, sheet, option=None):
     """
     Given the uploaded stock Excel file, search the barcode that listed before through the file.
@@ -893,13 +1351,7 @@ def GetStockData(uploaded_file, sheet, option=None):
         # Some file-like objects may not have seek; ignore if so
         pass
 
-    if sheet != 0 and option == "MR":
-        data_cols = [2, 3, 4, 5]
-    elif sheet != 0 and option != "GL":
-        data_cols = [2, 3, 4, 6]
-    else:
-        data_cols = [2, 3, 6]
-        sheet = {1: 2, 4: 3}.get(sheet, sheet)
+    sheet, data_cols = GetStockLayout(sheet, option)
 
     wb = load_workbook(uploaded_file, data_only=True)
     ws = wb.worksheets[sheet]  # or wb["SheetName"] if you want a specific sheet
@@ -921,15 +1373,421 @@ def GetStockData(uploaded_file, sheet, option=None):
 
     return data
 
+def GetExpressSummary(uploaded_files):
+    """
+    GetExpressData + SummariseByBarcodeFrame over one or more Express
+    exports, reused across reruns until the uploaded bytes change.
+
+    The files are parsed concurrently on threads. Streamlit runs this script
+    as __main__, so process workers could not import the parser back.
+
+    Returns:
+        tuple: (summary, bill_numbers, total)
+    """
+    def Parse():
+        with Stage("GetExpressData", rows_in=len(uploaded_files)) as stage:
+            with ThreadPoolExecutor(max_workers=min(len(uploaded_files), os.cpu_count() or 1)) as pool:
+                parsed = list(pool.map(GetExpressData, uploaded_files))
+            stage["rows_out"] = sum(len(data) for data, _, _ in parsed)
+
+        return MergeExpressData(parsed)
+
+    with Stage("GetExpressSummary", rows_in=len(uploaded_files)) as stage:
+        key = ("express",) + tuple(FileDigest(uploaded_file) for uploaded_file in uploaded_files)
+        summary = CachedParse(key, Parse)
+        stage["rows_out"] = len(summary[0])
+
+    return summary
+
+def MergeExpressData(parsed):
+    """
+    Combine the GetExpressData results of several exports as if they were
+    one report: the rows are summarised together, the bill numbers are the
+    union in first-seen order and the totals are added up. The total is
+    formatted by FormatExpressTotal whatever the number of exports.
+
+    Returns:
+        tuple: (summary, bill_numbers, total)
+    """
+    if len(parsed) == 1:
+        express_data, bill_numbers, total = parsed[0]
+    else:
+        express_data, bill_numbers, total = CombineExpressData(parsed)
+
+    with Stage("SummariseByBarcodeFrame", rows_in=len(express_data)) as stage:
+        summary = SummariseByBarcodeFrame(express_data)
+        stage["rows_out"] = len(summary)
+
+    return summary, bill_numbers, FormatExpressTotal(total)
+
+def CombineExpressData(parsed):
+    """
+    Rows, bill numbers and total of several GetExpressData results.
+    """
+    express_data = [row for data, _, _ in parsed for row in data]
+
+    # The same bill can be in more than one export
+    bill_numbers = list(dict.fromkeys(
+        bill for _, bills, _ in parsed for bill in bills
+    ))
+
+    total = sum(ParseExpressAmount(amount) for _, _, amount in parsed)
+
+    return express_data, bill_numbers, total
+
+def ParseExpressAmount(amount):
+    """
+    Float of an Express amount such as '12,345.00'.
+    """
+    return float(str(amount).replace(",", ""))
+
+def FormatExpressTotal(total):
+    """
+    Report text of a total, '12,345.00'. A total that is not a number is
+    kept as Express printed it.
+    """
+    try:
+        return f"{ParseExpressAmount(total):,.2f}"
+    except ValueError:
+        return str(total)
+
+def GetStockLayout(sheet, option=None):
+    """
+    Map the customer's stock sheet/option to the worksheet index and the
+    columns GetStockData reads from it.
+
+    Returns:
+        tuple: (sheet, data_cols)
+    """
+    if sheet != 0 and option == "MR":
+        data_cols = [2, 3, 4, 5]
+    elif sheet != 0 and option != "GL":
+        data_cols = [2, 3, 4, 6]
+    else:
+        data_cols = [2, 3, 6]
+        sheet = {1: 2, 4: 3}.get(sheet, sheet)
+
+    return sheet, data_cols
+
+def GetCachedStockData(uploaded_file, sheet, option, express_data):
+    """
+    Stock rows for the barcodes of express_data, looked up in the on-disk
+    stock index and reused across reruns until either upload changes.
+    """
+    barcodes = express_data["barcode"].tolist()
+
+    with Stage("GetCachedStockData", rows_in=len(barcodes)) as stage:
+        # A digest, not hash(): a collision would hand back another report's rows
+        barcodes_digest = hashlib.sha256("\n".join(map(str, barcodes)).encode("utf-8")).hexdigest()
+        key = ("stock", FileDigest(uploaded_file), sheet, option, barcodes_digest)
+        stock_data = CachedParse(key, lambda: GetIndexedStockData(uploaded_file, sheet, option, barcodes))
+        stage["rows_out"] = len(stock_data)
+
+    return stock_data
+
+#endregion
+
+# region --- Parsed upload cache ---
+
+@st.cache_resource
+def GetParseCache():
+    """
+    Entry-bounded LRU store of parsed uploads (at most
+    PARSE_CACHE_MAX_ENTRIES of them, whatever their size) shared by every
+    rerun of the script. Cached values are shared, callers must treat them
+    as read-only.
+    """
+    return {
+        "entries": OrderedDict(),
+        "hits": 0,
+        "misses": 0,
+        "max_entries": PARSE_CACHE_MAX_ENTRIES,
+        "lock": Lock(),
+    }
+
+@st.cache_resource
+def GetReportCache():
+    """
+    LRU store of serialized report bytes, keyed by GetReportFingerprint.
+    """
+    return {
+        "entries": OrderedDict(),
+        "hits": 0,
+        "misses": 0,
+        "max_entries": REPORT_CACHE_MAX_ENTRIES,
+        "lock": Lock(),
+    }
+
+def CachedParse(key, loader, cache=None):
+    """
+    Return the cached value for key, or run loader() and keep its result,
+    evicting the least recently used entry once the cache is full.
+    Uses the parsed upload cache unless another cache is given.
+    """
+    cache = cache or GetParseCache()
+    entries = cache["entries"]
+
+    with cache["lock"]:
+        if key in entries:
+            entries.move_to_end(key)
+            cache["hits"] += 1
+            NoteStage(cache="hit")
+            return entries[key]
+
+    value = loader()
+    NoteStage(cache="miss")
+
+    with cache["lock"]:
+        cache["misses"] += 1
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > cache["max_entries"]:
+            entries.popitem(last=False)
+
+    return value
+
+def FileDigest(uploaded_file):
+    """
+    SHA-256 of the uploaded bytes, used as the cache key of a file.
+
+    In a script run the digest of an upload is remembered by its file_id in
+    st.session_state["file_digests"], so reruns don't hash it again.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    memo = None
+
+    # Deferred downloads and batch_report.py run without a session
+    if file_id is not None and get_script_run_ctx(suppress_warning=True) is not None:
+        memo = st.session_state.setdefault("file_digests", {})
+        if file_id in memo:
+            return memo[file_id]
+
+    if hasattr(uploaded_file, "getbuffer"):
+        # A view of the upload, getvalue() would copy it first
+        with uploaded_file.getbuffer() as view:
+            digest = hashlib.sha256(view).hexdigest()
+    else:
+        uploaded_file.seek(0)
+        digest = hashlib.sha256(uploaded_file.read()).hexdigest()
+        uploaded_file.seek(0)
+
+    if memo is not None:
+        memo[file_id] = digest
+        while len(memo) > FILE_DIGEST_MEMO_ENTRIES:
+            del memo[next(iter(memo))]
+
+    return digest
+
+def GetUploadDigests():
+    """
+    Digests of the Express files and the stock file in session state, in
+    upload order. Pages take them once per run for their fingerprints.
+    """
+    express_files = st.session_state.get("excel_file_1") or []
+    stock_file = st.session_state.get("excel_file_2")
+
+    digests = [FileDigest(uploaded_file) for uploaded_file in express_files]
+    if stock_file is not None:
+        digests.append(FileDigest(stock_file))
+
+    return digests
+
+def GetReportFingerprint(digests, *inputs):
+    """
+    Key of a generated report: the digests of the uploaded files
+    (GetUploadDigests) plus every user input that ends up in the workbook.
+    """
+    return hashlib.sha256(repr((digests, inputs)).encode("utf-8")).hexdigest()
+
+def ShowParseCacheStats():
+    cache = GetParseCache()
+    st.caption(
+        f"Parsed upload cache: {cache['hits']} hits / {cache['misses']} misses "
+        f"({len(cache['entries'])}/{PARSE_CACHE_MAX_ENTRIES} entries)"
+    )
+
+#endregion
+
+# region --- On-disk stock index ---
+
+def GetIndexedStockData(uploaded_file, sheet, option, barcodes):
+    """
+    Return the stock rows (same shape as GetStockData) for the given
+    barcodes from the SQLite stock index.
+
+    The index keeps one row per normalized barcode (SafeInt) for each stock
+    layout. A stock file version is only parsed the first time it is seen,
+    and then only the rows that changed since the previous version are
+    written back.
+    """
+    digest = FileDigest(uploaded_file)
+    layout = json.dumps(GetStockLayout(sheet, option))
+
+    normalized = [
+        str(barcode) for barcode in map(SafeInt, barcodes)
+        if barcode is not None
+    ]
+
+    # A deferred transaction: readers share the index, and the check and
+    # the lookup see the same version of it
+    with OpenStockIndex() as con:
+        con.execute("BEGIN")
+        if IndexedStockDigest(con, layout) == digest:
+            return LookupStockRows(con, layout, normalized)
+
+    # Parsed before the write lock is taken, so other sessions are not kept
+    # waiting on the Excel parse
+    stock_data = ParseStockData(uploaded_file, sheet, option)
+
+    # The check, the refresh and the lookup run in one write transaction:
+    # another session indexing another file of this layout in between
+    # would otherwise hand this caller its rows
+    with OpenStockIndex() as con:
+        con.execute("BEGIN IMMEDIATE")
+
+        if IndexedStockDigest(con, layout) != digest:
+            with Stage("RefreshStockIndex", rows_in=len(stock_data)):
+                RefreshStockIndex(con, layout, digest, stock_data)
+
+        return LookupStockRows(con, layout, normalized)
+
+def LookupStockRows(con, layout, normalized):
+    rows = con.execute(
+        "SELECT payload FROM stock_rows"
+        " WHERE layout = ? AND barcode IN (SELECT value FROM json_each(?))",
+        (layout, json.dumps(normalized)),
+    ).fetchall()
+
+    return [DecodeStockRow(payload) for (payload,) in rows]
+
+def IndexedStockDigest(con, layout):
+    """
+    Digest of the stock file the index holds for layout, None if none.
+    """
+    indexed = con.execute(
+        "SELECT digest FROM stock_versions WHERE layout = ?", (layout,)
+    ).fetchone()
+    return indexed and indexed[0]
+
+def ParseStockData(uploaded_file, sheet, option):
+    """
+    GetStockData recorded as a diagnostics stage.
+    """
+    with Stage("GetStockData") as stage:
+        stock_data = GetStockData(uploaded_file, sheet, option)
+        stage["rows_out"] = len(stock_data)
+    return stock_data
+
+def RefreshStockIndex(con, layout, digest, stock_data):
+    """
+    Bring the index of one stock layout in line with stock_data, touching
+    only inserted, changed and removed barcodes. Runs inside the caller's
+    transaction on con.
+    """
+    # Later rows win for a repeated barcode, same as the writers' lookup dict
+    latest = {}
+    for row in stock_data:
+        barcode = SafeInt(row[0])
+        if barcode is not None:
+            latest[str(barcode)] = EncodeStockRow(row)
+
+    con.execute("CREATE TEMP TABLE incoming (barcode TEXT PRIMARY KEY, payload BLOB)")
+    con.executemany("INSERT INTO incoming VALUES (?, ?)", latest.items())
+
+    con.execute(
+        "INSERT INTO stock_rows (layout, barcode, payload)"
+        " SELECT ?, barcode, payload FROM incoming WHERE true"
+        " ON CONFLICT (layout, barcode) DO UPDATE SET payload = excluded.payload"
+        " WHERE stock_rows.payload IS NOT excluded.payload",
+        (layout,),
+    )
+    con.execute(
+        "DELETE FROM stock_rows"
+        " WHERE layout = ? AND barcode NOT IN (SELECT barcode FROM incoming)",
+        (layout,),
+    )
+    con.execute(
+        "INSERT OR REPLACE INTO stock_versions (layout, digest) VALUES (?, ?)",
+        (layout, digest),
+    )
+    con.execute("DROP TABLE incoming")
+
+def EncodeStockRow(row):
+    """
+    JSON text of a stock row. openpyxl's date and time values are tagged
+    so DecodeStockRow gives them back as they were.
+    """
+    return json.dumps(row, ensure_ascii=False, default=EncodeStockValue)
+
+def EncodeStockValue(value):
+    for kind in (datetime, date, time):
+        if isinstance(value, kind):
+            return {"$" + kind.__name__: value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$timedelta": value.total_seconds()}
+    raise TypeError(f"Cannot store {type(value).__name__} in the stock index")
+
+def DecodeStockRow(payload):
+    return json.loads(payload, object_hook=DecodeStockValue)
+
+def DecodeStockValue(tagged):
+    if len(tagged) == 1:
+        (tag, value), = tagged.items()
+        if tag == "$timedelta":
+            return timedelta(seconds=value)
+        for kind in (datetime, date, time):
+            if tag == "$" + kind.__name__:
+                return kind.fromisoformat(value)
+    return tagged
+
+@contextmanager
+def OpenStockIndex():
+    """
+    Connection to the stock index, committed on success and always closed.
+    An index of another STOCK_INDEX_VERSION is dropped and rebuilt.
+    """
+    os.makedirs(os.path.dirname(STOCK_INDEX_PATH), exist_ok=True)
+    con = sqlite3.connect(STOCK_INDEX_PATH, timeout=30)
+
+    try:
+        if con.execute("PRAGMA user_version").fetchone()[0] != STOCK_INDEX_VERSION:
+            con.execute("BEGIN IMMEDIATE")
+            if con.execute("PRAGMA user_version").fetchone()[0] != STOCK_INDEX_VERSION:
+                CreateStockIndex(con)
+            con.commit()
+
+        yield con
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+def CreateStockIndex(con):
+    con.execute("DROP TABLE IF EXISTS stock_rows")
+    con.execute("DROP TABLE IF EXISTS stock_versions")
+    con.execute(
+        "CREATE TABLE stock_rows ("
+        " layout TEXT, barcode TEXT, payload TEXT,"
+        " PRIMARY KEY (layout, barcode)) WITHOUT ROWID"
+    )
+    con.execute(
+        "CREATE TABLE stock_versions ("
+        " layout TEXT PRIMARY KEY, digest TEXT)"
+    )
+    con.execute(f"PRAGMA user_version = {STOCK_INDEX_VERSION}")
+
 #endregion
 
 # region --- General user interface functions ---
 
 def ExcelUploadSection():
     """
-    Show an interface that lets the user upload two Excel files.
+    Show an interface that lets the user upload the Express exports (one
+    or more, merged into one report) and the stock file.
     The uploaded files are stored in:
-        st.session_state["excel_file_1"]
+        st.session_state["excel_file_1"]  (list of Express files)
         st.session_state["excel_file_2"]
     so you can use them later in your code.
     """
@@ -937,9 +1795,10 @@ def ExcelUploadSection():
     st.subheader("Upload Excel Files")
 
     file1 = st.file_uploader(
-        "Upload the Excel file from Express Accounting.",
+        "Upload the Excel file from Express Accounting. Several exports are merged into one report.",
         type=["xlsx", "xlsm", "xls"],
         key=f"excel_upload_1",
+        accept_multiple_files=True,
     )
 
     file2 = st.file_uploader(
@@ -949,7 +1808,7 @@ def ExcelUploadSection():
     )
 
     # Store them in session_state so other blocks can use them
-    if file1 is not None:
+    if file1:
         st.session_state["excel_file_1"] = file1
 
     if file2 is not None:
@@ -970,7 +1829,7 @@ def GetUserCompanyChoice():
 
         if col.button(label, use_container_width=True):
             if option != st.session_state.prev_choice:
-                keep_keys = {"excel_file_1", "excel_file_2", "prev_choice"}
+                keep_keys = {"excel_file_1", "excel_file_2", "file_digests", "prev_choice", "diagnostics"}
                 for key in list(st.session_state.keys()):
                     if key not in keep_keys:
                         del st.session_state[key]
@@ -1017,7 +1876,75 @@ def GetUserInputDates():
     end_date = f"{end_date.strftime('%d.%m')}.{end_date.year + 543}"
     return start_date, end_date
 
-def DownloadFile(wb):
+def GetReportBody(customer, key, build):
+    """
+    Workbook with everything that only depends on the uploads (and the
+    template sheet), built by build() once per key and kept for the session,
+    so editing a form field does not rebuild the report.
+    """
+    body = st.session_state.get("report_body")
+
+    with Stage("GetReportBody") as stage:
+        if body is not None and body["key"] == key:
+            stage["cache"] = "hit"
+            return body
+
+        stage["cache"] = "miss"
+        wb = build()
+        ws = wb.active
+        body = {
+            "key": key,
+            "wb": wb,
+            # What the header cells hold before any form field is written
+            "header": {coord: ws[coord].value for coord in REPORT_HEADER_CELLS[customer]},
+            "images": SnapshotImages(wb),
+            "lock": Lock(),
+        }
+        st.session_state["report_body"] = body
+
+    return body
+
+def SaveReportBody(body, write_header):
+    """
+    Reset the header cells of a cached report body, write them with
+    write_header(wb) and return the serialized workbook.
+    """
+    with body["lock"], Stage("SaveReportBody"):
+        ws = body["wb"].active
+        for coord, value in body["header"].items():
+            ws[coord].value = value
+
+        # openpyxl closes an image's source once it has written it
+        for image, data in body["images"]:
+            image.ref = BytesIO(data)
+
+        wb = write_header(body["wb"])
+        output_excel_file = BytesIO()
+        wb.save(output_excel_file)
+
+    return output_excel_file.getvalue()
+
+def SnapshotImages(wb):
+    """
+    (image, bytes) of every in-memory image of the workbook, so it can be
+    saved more than once.
+    """
+    images = []
+    for ws in wb.worksheets:
+        for image in ws._images:
+            if hasattr(image.ref, "read"):
+                image.ref.seek(0)
+                images.append((image, image.ref.read()))
+
+    return images
+
+def DownloadFile(fingerprint, serialize):
+    """
+    Offer the report for download. serialize() only runs once the button
+    is clicked, usually SaveReportBody on the cached body (GetReportBody).
+    The bytes are kept by fingerprint (GetReportFingerprint) so the same
+    report is never saved twice.
+    """
     st.divider()
     st.subheader("Download the Excel file")
 
@@ -1027,13 +1954,13 @@ def DownloadFile(wb):
         value=False
     )
 
-    output_excel_file = BytesIO()
-    wb.save(output_excel_file)
-    output_excel_file.seek(0)
+    def Serialize():
+        return CachedParse(("report", fingerprint), serialize, GetReportCache())
 
     st.download_button(
         label="⬇️ Download Excel File",
-        data=output_excel_file,
+        # Runs after the script, its stages are logged as a run of their own
+        data=DeferStages("order_check download", Serialize),
         file_name="output.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         disabled = not agree,
@@ -1043,6 +1970,92 @@ def DownloadFile(wb):
 
 # region --- General helper function ---
    
+def GetMergedCellIndex(ws):
+    """
+    Per column interval index of the worksheet's merged ranges, built once
+    and rebuilt only when the merged ranges change.
+
+    Returns:
+        dict: {column: (starts, ends, anchors)}, the row intervals covering
+        that column sorted by start row. anchors holds the row of the range's
+        top-left cell when the column is its first column, else 0.
+    """
+    bounds = tuple(merged.bounds for merged in ws.merged_cells.ranges)
+    cached = MERGED_CELL_INDEXES.get(ws)
+    if cached is not None and cached[0] == bounds:
+        return cached[1]
+
+    intervals = {}
+    for min_col, min_row, max_col, max_row in bounds:
+        for col in range(min_col, max_col + 1):
+            anchor = min_row if col == min_col else 0
+            intervals.setdefault(col, []).append((min_row, max_row, anchor))
+
+    merged_index = {}
+    for col, spans in intervals.items():
+        spans.sort()
+        merged_index[col] = tuple(list(values) for values in zip(*spans))
+
+    MERGED_CELL_INDEXES[ws] = (bounds, merged_index)
+    return merged_index
+
+def IsHiddenByMerge(merged_index, row, col):
+    """
+    True when (row, col) is covered by a merged range but is not its
+    top-left cell, in O(log m) for m ranges crossing the column.
+    """
+    column = merged_index.get(col)
+    if column is None:
+        return False
+
+    starts, ends, anchors = column
+    i = bisect_right(starts, row) - 1
+    return i >= 0 and row <= ends[i] and row != anchors[i]
+
+def GetColumnWidthTracker(ws):
+    """
+    Per worksheet {column: widest text} accumulator shared by the writers.
+    """
+    return COLUMN_WIDTHS.setdefault(ws, {})
+
+def TrackColumnWidth(widths, col, value):
+    """
+    Record the display width of value in col, measured on its first line
+    only so very long multi-line values are ignored.
+    """
+    if value is None:
+        return
+
+    text_len = len(str(value).split("\n")[0])
+    if text_len > widths.get(col, 0):
+        widths[col] = text_len
+
+def RegisterStyle(wb, name):
+    """
+    Intern the CELL_STYLES combination `name` in the workbook's style
+    tables and return its StyleArray, the same ids openpyxl would store
+    if each attribute were assigned to the cell one by one.
+    """
+    style = StyleArray()
+    spec = CELL_STYLES[name]
+
+    if "font" in spec:
+        style.fontId = wb._fonts.add(spec["font"])
+    if "fill" in spec:
+        style.fillId = wb._fills.add(spec["fill"])
+    if "border" in spec:
+        style.borderId = wb._borders.add(spec["border"])
+    if "alignment" in spec:
+        style.alignmentId = wb._alignments.add(spec["alignment"])
+
+    return style
+
+def ApplyStyle(cell, style):
+    """
+    Stamp a registered StyleArray onto a cell, replacing its whole style.
+    """
+    cell._style = copy(style)
+
 def SafeInt(x):
     try:
         return int(x)
@@ -1055,12 +2068,40 @@ def GetLastRealRow(ws, col=1):
         row -= 1
     return row
 
-def GetLastRealCol(ws):
+def GetLastRealCol(ws, row=None):
+    if row is None:
+        row = GetLastRealRow(ws)
+
     col = ws.max_column
-    while col > 0 and ws.cell(row=GetLastRealRow(ws), column=col).value is None:
+    while col > 0 and ws.cell(row=row, column=col).value is None:
         col -= 1
     return col
 
+def GetSheetExtent(ws):
+    """
+    Last real row (column A) and last real column of that row, scanned
+    once per worksheet and then kept up to date by ExtendSheetExtent.
+    Writers that append rows must report them, or the extent goes stale.
+
+    Returns:
+        dict: {"row": ..., "col": ...}
+    """
+    extent = SHEET_EXTENTS.get(ws)
+    if extent is None:
+        row = GetLastRealRow(ws)
+        extent = {"row": row, "col": GetLastRealCol(ws, row)}
+        SHEET_EXTENTS[ws] = extent
+    return extent
+
+def ExtendSheetExtent(ws, row, last_col):
+    """
+    Record that row was written with values up to last_col.
+    """
+    extent = GetSheetExtent(ws)
+    if row >= extent["row"]:
+        extent["row"] = row
+        extent["col"] = last_col
+
 def has_thai(value) -> bool:
     if value is None:
         return False
@@ -1070,4 +2111,5 @@ def has_thai(value) -> bool:
 
 # endregion
 
-main()
+if __name__ == "__main__":
+    main()
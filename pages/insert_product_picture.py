@@ -6,6 +6,9 @@ from openpyxl.drawing.spreadsheet_drawing import OneCellAnchor, AnchorMarker
 from openpyxl.drawing.xdr import XDRPositiveSize2D
 from PIL import Image
 import io
+from diagnostics import StartDiagnostics, ShowDiagnostics, Stage
+
+StartDiagnostics("insert_product_picture")
 
 st.title("Product Image Inserter")
 
@@ -49,13 +52,8 @@ def insert_resized_image_center(ws, row, img_bytes):
     new_img.anchor = OneCellAnchor(_from = _from, ext = ext)
 
 
-if template_file and product_images_file and st.button("Process"):
-    template_wb = load_workbook(io.BytesIO(template_file.read()))
-    template_ws = template_wb.active
-
-    product_images_wb = load_workbook(io.BytesIO(product_images_file.read()))
-    product_images_ws = product_images_wb.active
-
+def insert_product_images(template_ws, product_images_ws):
+    """Put the picture of the product listed in A9:A13 of the template into column B."""
     template_ws.column_dimensions["B"].width = 30  # default width if not set
 
     for row in range(9, 14):
@@ -73,9 +71,24 @@ if template_file and product_images_file and st.button("Process"):
                     img_bytes = image._data()
                     insert_resized_image_center(template_ws, row, img_bytes)
 
-    output = io.BytesIO()
-    template_wb.save(output)
-    output.seek(0)
+
+if template_file and product_images_file and st.button("Process"):
+    with Stage("load workbooks") as stage:
+        template_wb = load_workbook(io.BytesIO(template_file.read()))
+        template_ws = template_wb.active
+
+        product_images_wb = load_workbook(io.BytesIO(product_images_file.read()))
+        product_images_ws = product_images_wb.active
+        stage["rows_out"] = product_images_ws.max_row
+
+    with Stage("insert_product_images", rows_in=product_images_ws.max_row) as stage:
+        insert_product_images(template_ws, product_images_ws)
+        stage["rows_out"] = len(template_ws._images)
+
+    with Stage("save"):
+        output = io.BytesIO()
+        template_wb.save(output)
+        output.seek(0)
 
     st.success("Image copied to template successfully!")
 
@@ -85,3 +98,5 @@ if template_file and product_images_file and st.button("Process"):
         file_name="updated_template.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
+
+ShowDiagnostics()
@@ -1,8 +1,18 @@
 import streamlit as st
 import pandas as pd
 import re
-from openpyxl import load_workbook
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from copy import copy
+from threading import Lock
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from io import BytesIO
+from diagnostics import StartDiagnostics, ShowDiagnostics, Stage, NoteStage
+
+StartDiagnostics("product_price_checker")
 
 st.title("Excel Matcher — Update Price")
 
@@ -19,24 +29,47 @@ file_right = st.file_uploader("Upload Update Price Excel file", type=["xlsx","xl
 
 SPACE_CHARS = r"\u0020\u00A0\u1680\u2000-\u200A\u202F\u205F\u3000"
 
+SPACE_RUN = re.compile(f"[{SPACE_CHARS}]+")
+LEADING_NO = re.compile(r"^(?:No)+", flags=re.IGNORECASE)
+BARCODE_PREFIX = re.compile(r"^([^ /\+\u0E00-\u0E7F]+)")
+
+# Distinct barcode texts remembered by clean_barcode
+CLEAN_BARCODE_CACHE_SIZE = 65536
+
 def clean_barcode(raw: str) -> str:
     if pd.isna(raw):
         return ""
 
-    s = str(raw)
+    return clean_barcode_text(str(raw))
 
+@lru_cache(maxsize=CLEAN_BARCODE_CACHE_SIZE)
+def clean_barcode_text(s: str) -> str:
     # Normalize ALL weird spaces to normal space
-    s = re.sub(f"[{SPACE_CHARS}]+", " ", s)
+    s = SPACE_RUN.sub(" ", s)
 
     s = s.strip()
 
     # Remove repeated "No", "NO", "no", etc. at the beginning
-    s = re.sub(r"^(?:No)+", "", s, flags=re.IGNORECASE).strip()
+    s = LEADING_NO.sub("", s).strip()
 
     # Extract until space, slash, plus, Thai chars — KEEP brackets
-    m = re.match(rf"^[^ /\+\u0E00-\u0E7F]+", s)
+    m = BARCODE_PREFIX.match(s)
     return m.group(0) if m else s
 
+def clean_barcodes(values: pd.Series) -> pd.Series:
+    """clean_barcode of every value, each distinct value cleaned once with pandas string operations."""
+    codes, uniques = pd.factorize(values)
+
+    # object dtype keeps Python's re and str.strip semantics
+    s = pd.Series(uniques, dtype=object).map(str)
+    s = s.str.replace(SPACE_RUN, " ", regex=True).str.strip()
+    s = s.str.replace(LEADING_NO, "", regex=True).str.strip()
+    s = s.str.extract(BARCODE_PREFIX, expand=False).fillna(s)
+
+    # Missing values (code -1) pick the trailing ""
+    cleaned = np.append(s.to_numpy(dtype=object), "")
+    return pd.Series(cleaned[codes], index=values.index, dtype=object)
+
 
 # =========================================================
 # --- Other helper functions (unchanged) ---
@@ -71,92 +104,317 @@ def read_any_table(uploaded):
     else:
         raise ValueError("Unsupported file type")
 
+# Parsed update price lists kept across reruns, each holds a whole workbook
+UPDATE_PRICE_CACHE_ENTRIES = 2
+
+@st.cache_resource
+def get_update_price_cache():
+    """LRU store of load_update_price_list results, shared by every rerun of the page."""
+    return {"entries": OrderedDict(), "lock": Lock()}
+
+def load_update_price_list(uploaded):
+    """
+    The update price file parsed once: its active sheet for
+    build_filtered_workbook and its first sheet as the table the matching
+    reads (what pd.read_excel(header=0, dtype=str) returns). Kept by
+    SHA-256 of the upload, so reruns with the same file skip the parse;
+    the sheet with its formulas joins the same entry when
+    build_result_workbook first needs it (load_formula_sheet).
+    Shared between reruns, treat it as read-only.
+    """
+    data = uploaded.getvalue()
+    key = hashlib.sha256(data).hexdigest()
+    cache = get_update_price_cache()
+    entries = cache["entries"]
+
+    with cache["lock"]:
+        if key in entries:
+            entries.move_to_end(key)
+            NoteStage(cache="hit")
+            return entries[key]
+
+    # data_only as pandas loads it: formulas are read as their saved values
+    wb = load_workbook(BytesIO(data), data_only=True)
+    # pandas reads the cells of the parsed workbook instead of the file again
+    table = pd.read_excel(wb, header=0, dtype=str, engine="openpyxl")
+
+    sheet = wb.active
+    # Worksheet.max_column scans every cell, look it up once
+    update_list = {
+        "sheet": sheet,
+        "max_col": sheet.max_column,
+        "table": table,
+        "data": data,
+        "formula_sheet": None,
+        "lock": Lock(),
+    }
+    NoteStage(cache="miss")
+
+    with cache["lock"]:
+        entries[key] = update_list
+        entries.move_to_end(key)
+        while len(entries) > UPDATE_PRICE_CACHE_ENTRIES:
+            entries.popitem(last=False)
+
+    return update_list
+
+def load_formula_sheet(update_list):
+    """
+    The active sheet of the update price file with its formulas, loaded
+    once per load_update_price_list entry. Shared, treat it as read-only.
+    """
+    with update_list["lock"]:
+        if update_list["formula_sheet"] is None:
+            update_list["formula_sheet"] = load_workbook(BytesIO(update_list["data"])).active
+            NoteStage(cache="miss")
+        else:
+            NoteStage(cache="hit")
+
+        return update_list["formula_sheet"]
+
 # =========================================================
-# --- Main processing (unchanged except uses new cleaner) ---
+# --- Processing steps ---
 # =========================================================
 
-if st.button("Process files"):
-
-    if file_left is None or file_right is None:
-        st.error("Please upload both files.")
-    else:
-        st.info("Reading files...")
-        left_df = read_any_table(file_left)
-        right_df = pd.read_excel(file_right, header=0, dtype=str, engine="openpyxl")
-
-        left_indices = []
-        left_products = []
-        left_prices = []
-
-        for i, row in left_df.iterrows():
-            row_str = str(row[0])
-            cols = re.split(r'\s{2,}', row_str.strip())
-            if len(cols) < 2:
-                continue
-            if not is_integer_token(cols[0]):
-                continue
-
-            left_indices.append(i)
-            cleaned_prod = clean_barcode(cols[1])   # ← NEW CLEANER USED HERE
-            left_products.append(cleaned_prod)
-
-            if len(cols) >= 4 and numeric_value_for_compare(cols[3]) == numeric_value_for_compare(cols[3]):
-                left_prices.append(cols[3])
-            elif len(cols) >= 5:
-                left_prices.append(cols[4])
-            else:
-                left_prices.append("")
-
-        left_table = pd.DataFrame({
-            "Index": left_indices,
-            "Product": left_products,
-            "Unit Price": left_prices
-        })
-
-        keep_unmatch_idx = []
-        keep_outdated_idx = []
+REPORT_COLUMN_SEPARATOR = r'\s{2,}'
 
-        for i, row in right_df.iterrows():
-            search = clean_barcode(row.iloc[0])   # ← NEW CLEANER USED HERE
-            found_idx = None
+# What float() accepts once numeric_value_for_compare has dropped everything but digits, '.' and '-'
+NUMERIC_TEXT = r'-?(?:\d+\.?\d*|\.\d+)'
 
-            for j, prod in left_table['Product'].items():
-                if str(search).strip() == str(prod).strip():
-                    found_idx = j
-                    break
+def parse_left_report(left_df):
+    """Index, cleaned barcode and unit price of every item line of the 42C-R1 report."""
+    if 0 not in left_df.columns:
+        return pd.DataFrame({"Index": [], "Product": [], "Unit Price": []})
 
-            if found_idx is None:
-                keep_unmatch_idx.append(i)
-            else:
-                left_price_val = numeric_value_for_compare(left_table.loc[found_idx, 'Unit Price'])
-                right_price_val = numeric_value_for_compare(row.iloc[3]) if len(row) > 3 else float('nan')
-                if round(left_price_val,2) != round(right_price_val,2):
-                    keep_outdated_idx.append(i)
+    # object dtype keeps Python's re and str semantics (Unicode \s and digits) in the .str calls
+    lines = left_df[0].fillna("").astype(str).astype(object).str.strip()
+
+    # Only the first five columns of a line are ever looked at
+    cols = lines.str.split(REPORT_COLUMN_SEPARATOR, n=5, expand=True, regex=True)
+    cols = cols.reindex(columns=range(5))
+
+    is_item = cols[1].notna() & cols[0].str.strip().str.isdigit().fillna(False).astype(bool)
+    cols = cols[is_item]
+
+    has_price_col = cols[3].notna() & (
+        cols[3].fillna("").str.replace(r'[^\d.\-]', '', regex=True).str.fullmatch(NUMERIC_TEXT).fillna(False).astype(bool)
+    )
+    prices = cols[3].where(has_price_col, cols[4].fillna(""))
+
+    left_indices = cols.index.tolist()
+    left_products = clean_barcodes(cols[1]).tolist()   # ← NEW CLEANER USED HERE
+    left_prices = prices.tolist()
+
+    return pd.DataFrame({
+        "Index": left_indices,
+        "Product": left_products,
+        "Unit Price": left_prices
+    })
+
+def build_product_index(left_table):
+    """Unit price of each product, keyed like the match compares it; the first line of a product wins."""
+    product_index = {}
+    for prod, price in zip(left_table['Product'], left_table['Unit Price']):
+        product_index.setdefault(str(prod).strip(), price)
+    return product_index
+
+def find_unmatched_and_outdated(left_table, right_df):
+    """Rows of right_df (by position) not found in left_table, and found with another price."""
+    keep_unmatch_idx = []
+    keep_outdated_idx = []
+
+    if right_df.shape[1] == 0:
+        return keep_unmatch_idx, keep_outdated_idx
+
+    product_index = build_product_index(left_table)
+    right_prices = right_df.iloc[:, 3] if right_df.shape[1] > 3 else None
+
+    searches = clean_barcodes(right_df.iloc[:, 0])   # ← NEW CLEANER USED HERE
+
+    for pos, (i, search) in enumerate(zip(right_df.index, searches)):
+        search = search.strip()
+
+        if search not in product_index:
+            keep_unmatch_idx.append(i)
+        else:
+            left_price_val = numeric_value_for_compare(product_index[search])
+            right_price_val = numeric_value_for_compare(right_prices.iat[pos]) if right_prices is not None else float('nan')
+            if round(left_price_val,2) != round(right_price_val,2):
+                keep_outdated_idx.append(i)
+
+    return keep_unmatch_idx, keep_outdated_idx
+
+RESULT_SHEETS = ("Not Found Product", "Outdated Unit Price")
+
+def build_result_workbook(update_list, keep_unmatch_idx, keep_outdated_idx):
+    """
+    The sheet of a load_update_price_list result, with its formulas, as
+    two streaming (write-only) sheets holding every row, the ones not kept
+    hidden. Saved to a BytesIO.
+
+    The rows stay in place, so the formulas are written as they are. The
+    shared source sheet (load_formula_sheet) is only read.
+    """
+    source = load_formula_sheet(update_list)
+    max_row, max_col = source.max_row, source.max_column
+    cells = source._cells
+
+    wb = Workbook(write_only=True)
+    style_cache = {}
+
+    for title, keep_indices in zip(RESULT_SHEETS, (keep_unmatch_idx, keep_outdated_idx)):
+        sheet = wb.create_sheet(title)
+        copy_sheet_layout(source, sheet, source.merged_cells.ranges)
+
+        keep_excel_rows = {i+2 for i in keep_indices}
+        for r in range(1, max_row + 1):
+            copy_row_dimension(source, r, sheet, r)
+            if r > 1 and r not in keep_excel_rows:
+                sheet.row_dimensions[r].hidden = True
+
+            sheet.append([copy_cell(cells.get((r, col)), sheet, style_cache) for col in range(1, max_col + 1)])
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+def build_filtered_workbook(update_list, keep_unmatch_idx, keep_outdated_idx):
+    """
+    The sheet of a load_update_price_list result as two streaming
+    (write-only) sheets that hold only the header and the kept rows, with
+    their styles, row heights, column widths, frozen panes, sheet
+    properties and print settings. Saved to a BytesIO.
+
+    Formulas are written as their saved values: the rows move, so a
+    relative reference would point at the wrong row. The shared source
+    sheet is only read.
+    """
+    source = update_list["sheet"]
+    max_col = update_list["max_col"]
+    cells = source._cells
+
+    wb = Workbook(write_only=True)
+    style_cache = {}
+
+    for title, keep_indices in zip(RESULT_SHEETS, (keep_unmatch_idx, keep_outdated_idx)):
+        sheet = wb.create_sheet(title)
+        copy_sheet_layout(source, sheet, [merged for merged in source.merged_cells.ranges if merged.max_row == 1])
+
+        for new_row, r in enumerate([1] + [i+2 for i in keep_indices], start=1):
+            dimension = source.row_dimensions.get(r)
+            if dimension is not None and dimension.height is not None:
+                sheet.row_dimensions[new_row].height = dimension.height
+
+            # Existing cells only, ws.cell() would add the missing ones to the shared sheet
+            sheet.append([copy_cell(cells.get((r, col)), sheet, style_cache) for col in range(1, max_col + 1)])
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+def copy_sheet_layout(source, sheet, merged_ranges):
+    """
+    Column widths, frozen panes, sheet properties, print settings and the
+    given merged ranges of source on a write-only sheet, which takes them
+    before its first row.
+    """
+    for letter, dimension in source.column_dimensions.items():
+        target = sheet.column_dimensions[letter]
+        target.min, target.max = dimension.min, dimension.max
+        target.width = dimension.width
+        target.hidden = dimension.hidden
+    # What copy_worksheet carries over besides cells and dimensions
+    sheet.sheet_format = copy(source.sheet_format)
+    sheet.sheet_properties = copy(source.sheet_properties)
+    sheet.page_margins = copy(source.page_margins)
+    sheet.page_setup = copy(source.page_setup)
+    sheet.print_options = copy(source.print_options)
+    sheet.freeze_panes = source.freeze_panes
+    for merged in merged_ranges:
+        sheet.merged_cells.add(merged.coord)
+
+def copy_row_dimension(source, r, sheet, new_row):
+    """Height, hidden flag and outline level of row r of source on row new_row of sheet."""
+    dimension = source.row_dimensions.get(r)
+    if dimension is None:
+        return
+    target = sheet.row_dimensions[new_row]
+    target.height = dimension.height
+    target.hidden = dimension.hidden
+    target.outlineLevel = dimension.outlineLevel
+
+def copy_cell(cell, sheet, style_cache):
+    """
+    The cell as a WriteOnlyCell of sheet, None when missing, or empty and
+    unstyled.
+    Each source style is copied into the new workbook once and then reused
+    through style_cache.
+    """
+    if cell is None or (cell.value is None and not cell.has_style):
+        return None
+
+    new_cell = WriteOnlyCell(sheet, value=cell.value)
+    if cell.comment is not None:
+        new_cell.comment = copy(cell.comment)
+    if cell.hyperlink is not None:
+        new_cell.hyperlink = copy(cell.hyperlink)
+    if not cell.has_style:
+        return new_cell
+
+    key = tuple(cell._style)
+    if key not in style_cache:
+        new_cell.font = copy(cell.font)
+        new_cell.fill = copy(cell.fill)
+        new_cell.border = copy(cell.border)
+        new_cell.alignment = copy(cell.alignment)
+        new_cell.number_format = cell.number_format
+        new_cell.protection = copy(cell.protection)
+        style_cache[key] = copy(new_cell._style)
+
+    new_cell._style = copy(style_cache[key])
+    return new_cell
 
-        wb = load_workbook(file_right)
-        original_sheet = wb.active
-
-        sheet_unmatch = wb.copy_worksheet(original_sheet)
-        sheet_unmatch.title = "Not Found Product"
-
-        sheet_outdated = wb.copy_worksheet(original_sheet)
-        sheet_outdated.title = "Outdated Unit Price"
-
-        wb.remove(original_sheet)
+# =========================================================
+# --- Main processing (unchanged except uses new cleaner) ---
+# =========================================================
 
-        def hide_rows(sheet, keep_indices):
-            total_rows = sheet.max_row
-            keep_excel_rows = [i+2 for i in keep_indices]
-            for r in range(2, total_rows+1):
-                if r not in keep_excel_rows:
-                    sheet.row_dimensions[r].hidden = True
+output_mode = st.radio(
+    "Result sheets",
+    ["Only the listed rows", "Whole list, other rows hidden"],
+    horizontal=True,
+)
 
-        hide_rows(sheet_unmatch, keep_unmatch_idx)
-        hide_rows(sheet_outdated, keep_outdated_idx)
+if st.button("Process files"):
 
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+    if file_left is None or file_right is None:
+        st.error("Please upload both files.")
+    else:
+        st.info("Reading files...")
+        with Stage("read_any_table") as stage:
+            left_df = read_any_table(file_left)
+            stage["rows_out"] = len(left_df)
+
+        with Stage("load_update_price_list") as stage:
+            update_list = load_update_price_list(file_right)
+            right_df = update_list["table"]
+            stage["rows_out"] = len(right_df)
+
+        with Stage("parse_left_report", rows_in=len(left_df)) as stage:
+            left_table = parse_left_report(left_df)
+            stage["rows_out"] = len(left_table)
+
+        with Stage("find_unmatched_and_outdated", rows_in=len(right_df)) as stage:
+            keep_unmatch_idx, keep_outdated_idx = find_unmatched_and_outdated(left_table, right_df)
+            stage["rows_out"] = len(keep_unmatch_idx) + len(keep_outdated_idx)
+
+        if output_mode == "Only the listed rows":
+            with Stage("build_filtered_workbook", rows_in=len(right_df)):
+                output = build_filtered_workbook(update_list, keep_unmatch_idx, keep_outdated_idx)
+        else:
+            with Stage("build_result_workbook", rows_in=len(right_df)):
+                output = build_result_workbook(update_list, keep_unmatch_idx, keep_outdated_idx)
 
         st.success("Processing complete. Download result:")
         st.download_button(
@@ -164,4 +422,6 @@ if st.button("Process files"):
             data=output,
             file_name="result.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
\ No newline at end of file
+        )
+
+ShowDiagnostics()
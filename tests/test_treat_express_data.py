@@ -0,0 +1,39 @@
+"""
+TreatExpressData against the previous quadratic implementation on small
+generated reports. benchmarks/treat_express_data.py times the two.
+"""
+import copy
+
+import pytest
+
+from order_check import TreatExpressData
+from benchmarks.synthetic import express_rows
+from benchmarks.treat_express_data import LegacyTreatExpressData
+
+
+@pytest.mark.parametrize("size", [0, 1, 50, 2_000])
+def test_same_output_as_legacy(size):
+    rows = express_rows(size, seed=size)
+    expected = LegacyTreatExpressData(copy.deepcopy(rows))
+
+    assert TreatExpressData(iter(rows)) == expected
+
+
+def test_rows_after_the_total_are_not_read():
+    rows = express_rows(200, seed=1)
+    expected = LegacyTreatExpressData(copy.deepcopy(rows))
+
+    def Rows():
+        for row in rows:
+            yield row
+            if row[0] == "รวมทั้งสิ้น":
+                raise AssertionError("read past the total line")
+
+    assert TreatExpressData(Rows()) == expected
+
+
+def test_missing_total_raises():
+    rows = [row for row in express_rows(50, seed=2) if row[0] != "รวมทั้งสิ้น"]
+
+    with pytest.raises(ValueError, match="รวมทั้งสิ้น"):
+        TreatExpressData(iter(rows))